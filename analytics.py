@@ -0,0 +1,108 @@
+"""Month/type/category aggregates for the Analytics page in one pass.
+
+`compute_analytics` reduces a `LedgerFrame` to a dense month x type x category
+cube of sums and counts in one pass over integer group codes (the categorical
+codes and a month index), summing the int64 paise amounts exactly, then derives the monthly trend,
+the per-type category totals and the transaction statistics from that small
+cube instead of re-grouping the full history for each chart. The app caches
+the resulting `LedgerAnalytics` per user data version.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+def empty_monthly_trend():
+    return pd.DataFrame({
+        'month': pd.Series(dtype='object'),
+        'type': pd.Series(dtype='object'),
+        'amount': pd.Series(dtype='int64')
+    })
+
+@dataclass(frozen=True)
+class LedgerAnalytics:
+    """Aggregates behind the Analytics page"""
+    # Columns month ('YYYY-MM'), type, amount (paise); one row per month and type with data
+    monthly: pd.DataFrame = field(default_factory=empty_monthly_trend)
+    # type -> DataFrame of (category, amount), by category
+    categories: dict = field(default_factory=dict)
+    count: int = 0
+    # Paise; the mean is rounded to a whole paisa
+    mean_amount: int = 0
+    largest_amount: int = 0
+    largest_category: str = ""
+    largest_type: str = ""
+
+    @property
+    def empty(self):
+        return self.count == 0
+
+    def category_totals(self, transaction_type):
+        """(category, amount) totals of one type"""
+        return self.categories.get(
+            transaction_type,
+            pd.DataFrame({'category': pd.Series(dtype='object'), 'amount': pd.Series(dtype='int64')})
+        )
+
+def compute_analytics(ledger):
+    """Aggregate a LedgerFrame into LedgerAnalytics"""
+    if ledger.empty:
+        return LedgerAnalytics()
+
+    df = ledger.df
+    amounts = df['amount'].to_numpy()
+    type_codes = df['type'].cat.codes.to_numpy().astype('int64')
+    category_codes = df['category'].cat.codes.to_numpy().astype('int64')
+    types = df['type'].cat.categories
+    categories = df['category'].cat.categories
+
+    months = df['created_at'].to_numpy().astype('datetime64[M]').astype('int64')
+    first_month = months.min()
+    month_codes = months - first_month
+    n_months = int(month_codes.max()) + 1
+    n_types = len(types)
+    n_categories = len(categories)
+
+    # One flat group index per row, then one integer sum and count per group.
+    # np.bincount would sum in float64; np.add.at keeps the sums exact int64.
+    group = (month_codes * n_types + type_codes) * n_categories + category_codes
+    size = n_months * n_types * n_categories
+    shape = (n_months, n_types, n_categories)
+    sums = np.zeros(size, dtype='int64')
+    np.add.at(sums, group, amounts)
+    sums = sums.reshape(shape)
+    counts = np.bincount(group, minlength=size).reshape(shape)
+
+    # Monthly trend: collapse categories, keep (month, type) pairs that have rows
+    month_sums = sums.sum(axis=2)
+    month_index, type_index = np.nonzero(counts.sum(axis=2))
+    month_labels = np.datetime_as_string(
+        (first_month + np.arange(n_months)).astype('datetime64[M]'), unit='M'
+    )
+    monthly = pd.DataFrame({
+        'month': month_labels[month_index],
+        'type': np.asarray(types, dtype=object)[type_index],
+        'amount': month_sums[month_index, type_index]
+    })
+
+    # Category totals per type: collapse months
+    category_sums = sums.sum(axis=0)
+    category_counts = counts.sum(axis=0)
+    category_totals = {}
+    for t, transaction_type in enumerate(types):
+        present = np.nonzero(category_counts[t])[0]
+        category_totals[transaction_type] = pd.DataFrame({
+            'category': np.asarray(categories, dtype=object)[present],
+            'amount': category_sums[t, present]
+        })
+
+    largest = int(amounts.argmax())
+    return LedgerAnalytics(
+        monthly=monthly,
+        categories=category_totals,
+        count=len(amounts),
+        mean_amount=int(round(amounts.sum() / len(amounts))),
+        largest_amount=int(amounts[largest]),
+        largest_category=str(categories[category_codes[largest]]),
+        largest_type=str(types[type_codes[largest]])
+    )
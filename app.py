@@ -9,6 +9,37 @@ from sqlalchemy import create_engine, text
 import numpy as np
 import os 
 
+# Cached frames are shared between reruns and pages; copy-on-write keeps them read-only
+pd.options.mode.copy_on_write = True
+
+from db import create_database_engine, env_flag
+from migrations import migrate, pending_migrations
+from partitions import maintain_partitions
+from statements import execute_statement
+from storage import get_backend
+from snapshot import DashboardSnapshot, load_dashboard_snapshot
+from search import search_transactions
+from money import MAX_AMOUNT_PAISE, format_currency, format_currency_series, to_paise
+from cache import DataCache, cached_per_user, fallback
+from shared_cache import create_shared_cache
+from invalidation import ChangeListener, listen_enabled, notify_triggers_installed
+from replicas import ReplicaRouter, get_replica_urls
+from fetch import create_fetch_executor, fetch_all
+from ledger import build_ledger_frame
+from analytics import LedgerAnalytics, compute_analytics
+from insights import build_insights, insight_metrics
+from charts import (
+    MAX_CHART_POINTS,
+    category_figure,
+    daily_balance_figure,
+    income_expense_figure,
+    monthly_trend_figure,
+)
+from export import EXPORT_FORMATS, available_export_formats, export_transactions, read_download
+from importer import import_statement
+from write_buffer import WriteBehindBuffer, write_behind_enabled, write_behind_settings
+from metrics import METRICS, render_prometheus, start_metrics_server
+
 # Page config
 st.set_page_config(
     page_title="Budget Buddy - Finance Tracker",
@@ -238,87 +269,54 @@ st.markdown("""
 @st.cache_resource
 def get_database_connection():
     """Create database connection with timeout and better error handling for Railway deployment"""
-    try:
-        # Get DATABASE_URL from environment
-        database_url = os.environ.get("DATABASE_URL")
-        
-        if not database_url:
-            print("❌ DATABASE_URL not found!")
-            return None
-        
-        # Clean up the URL and ensure SSL
-        if "?sslmode=" not in database_url and "sslmode=" not in database_url:
-            database_url += "?sslmode=require"
-        
-        print(f"🔗 Connecting to database...")
-        
-        # Create engine with optimized settings
-        engine = create_engine(
-            database_url,
-            connect_args={
-                "connect_timeout": 30,
-                "application_name": "budget_buddy_railway"
-            },
-            pool_size=3,
-            max_overflow=5,
-            pool_timeout=30,
-            pool_recycle=3600,
-            pool_pre_ping=True,
-            echo=False
-        )
-        
-        # Test the connection
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT 1 as test"))
-            test_result = result.fetchone()
-            if test_result and test_result[0] == 1:
-                print("✅ Database connection successful!")
-                return engine
-            else:
-                raise Exception("Connection test failed")
-        
-    except Exception as e:
-        print(f"❌ Database connection error: {str(e)}")
-        return None
+    return create_database_engine()
 
-def initialize_database():
-    """Initialize database tables with better error handling"""
-    print("🔄 Initializing database...")
-    
+@st.cache_resource
+def apply_migrations():
+    """Bring the schema up to date once per server process"""
     engine = get_database_connection()
     if engine is None:
-        return False
+        raise RuntimeError("No database connection")
     
-    try:
+    if not env_flag("AUTO_MIGRATE", default=True):
+        # Migrations are run by `python migrations.py migrate` in the deploy step
         with engine.connect() as conn:
-            # Create transactions table
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id SERIAL PRIMARY KEY,
-                    user_id VARCHAR(255) NOT NULL,
-                    type VARCHAR(50) NOT NULL,
-                    category VARCHAR(255) NOT NULL,
-                    amount DECIMAL(10,2) NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            
-            # Create indexes
-            conn.execute(text("""
-                CREATE INDEX IF NOT EXISTS idx_transactions_user_id 
-                ON transactions(user_id)
-            """))
-            
-            conn.execute(text("""
-                CREATE INDEX IF NOT EXISTS idx_transactions_date 
-                ON transactions(created_at)
-            """))
-            
-            conn.commit()
-            print("✅ Database initialized successfully!")
+            pending = pending_migrations(conn)
+        if pending:
+            raise RuntimeError(f"{len(pending)} schema migration(s) pending")
         return True
-        
+    
+    applied = migrate(engine)
+    print(f"✅ Database schema up to date ({len(applied)} migration(s) applied)")
+    return True
+
+@st.cache_resource(ttl=24 * 60 * 60)
+def maintain_upcoming_partitions():
+    """Create the coming months' transaction partitions, at most once a day per process"""
+    engine = get_database_connection()
+    if engine is None:
+        raise RuntimeError("No database connection")
+    
+    with engine.begin() as conn:
+        created = maintain_partitions(conn)
+    if created:
+        print(f"✅ Created {created} transaction partition(s)")
+    return True
+
+def ensure_upcoming_partitions():
+    """Keep partitions ready for new transactions; without them inserts fail"""
+    try:
+        # Failures are not cached, so the next rerun tries again
+        return maintain_upcoming_partitions()
+    except Exception as e:
+        print(f"❌ Partition maintenance error: {str(e)}")
+        return False
+
+def initialize_database():
+    """Make sure the schema is migrated; runs DDL at most once per process"""
+    try:
+        # Failures are not cached, so the retry button tries again
+        return apply_migrations()
     except Exception as e:
         print(f"❌ Database initialization error: {str(e)}")
         return False
@@ -331,18 +329,81 @@ def initialize_session_state():
     if 'db_initialized' not in st.session_state:
         st.session_state.db_initialized = initialize_database()
         
-def clear_data_cache():
-    """Clear all cached data"""
+@st.cache_resource
+def get_replica_router():
+    """Process-wide read router, or None unless DATABASE_REPLICA_URL is set"""
+    replica_urls = get_replica_urls()
+    engine = get_database_connection()
+    if not replica_urls or engine is None or get_backend(engine).embedded:
+        return None
+    try:
+        router = ReplicaRouter(engine, replica_urls)
+    except Exception as e:
+        print(f"❌ Could not set up read replicas: {str(e)}")
+        return None
+    print(f"✅ Routing reads to {len(router.replicas)} replica(s)")
+    return router
+
+@st.cache_resource
+def get_fetch_executor():
+    """Process-wide thread pool for fetching a page's independent queries concurrently"""
+    return create_fetch_executor()
+
+def fetch_concurrently(*calls):
+    """Results of the zero-argument `calls`, in order, fetched at the same time"""
+    return fetch_all(get_fetch_executor(), *calls)
+
+def read_connection(user_id):
+    """Connection for one of `user_id`'s reads: a replica when one is fresh enough, else the primary"""
+    router = get_replica_router()
+    if router is None:
+        return get_database_connection().connect()
+    return router.connect(user_id)
+
+@st.cache_resource
+def get_data_cache():
+    """Process-wide cache of per-user query results, backed by the shared tier if configured"""
     try:
-        # Clear specific cache functions
-        if 'get_transactions' in globals():
-            get_transactions.clear()
-        if 'get_summary' in globals():
-            get_summary.clear()
-        if 'get_category_summary' in globals():
-            get_category_summary.clear()
-        if 'get_daily_summary' in globals():
-            get_daily_summary.clear()
+        shared = create_shared_cache()
+        if shared is not None:
+            print(f"✅ Shared cache enabled ({shared.name})")
+    except Exception as e:
+        print(f"❌ Could not open the shared cache: {str(e)}")
+        shared = None
+    return DataCache(shared=shared)
+
+@st.cache_resource
+def get_change_listener():
+    """Process-wide listener for change notifications, or None where there are none"""
+    engine = get_database_connection()
+    if engine is None or get_backend(engine).embedded or not listen_enabled():
+        return None
+    try:
+        with engine.connect() as conn:
+            installed = notify_triggers_installed(conn)
+    except Exception as e:
+        print(f"❌ Could not check change notification triggers: {str(e)}")
+        return None
+    if not installed:
+        # Listening without the triggers would keep entries for the long push TTL unnoticed
+        print("⚠️ Change notification triggers are missing; run migrations to enable live invalidation")
+        return None
+    router = get_replica_router()
+    listener = ChangeListener(engine, get_data_cache(),
+                              on_change=router.note_writes if router is not None else None)
+    print(f"✅ Listening for data changes (cache TTL {listener.push_ttl}s while connected)")
+    return listener
+
+def clear_data_cache(user_id=None):
+    """Invalidate one user's cached data after a write (the current session's by default)"""
+    user_id = user_id or st.session_state.user_id
+    try:
+        # Route reads to the primary first, so a read recomputed after the
+        # version bump never lands on a replica that lacks the write
+        router = get_replica_router()
+        if router is not None:
+            router.note_write(user_id)
+        get_data_cache().bump_version(user_id)
     except Exception as e:
         print(f"Warning: Could not clear cache: {str(e)}")
 
@@ -352,22 +413,74 @@ def refresh_data_from_db():
     # Force rerun to refresh the UI
     st.rerun()
 
+@st.cache_resource
+def get_write_buffer():
+    """Process-wide write-behind buffer, or None unless WRITE_BEHIND is enabled"""
+    if not write_behind_enabled():
+        return None
+    engine = get_database_connection()
+    if engine is None or get_backend(engine).embedded:
+        # The batch insert is PostgreSQL-only; embedded writes are local anyway
+        return None
+    settings = write_behind_settings()
+    print(f"✅ Write-behind enabled ({settings['durability']}, batch {settings['batch_size']})")
+    # Captured now: cached resources are not reachable from the worker thread
+    router, cache = get_replica_router(), get_data_cache()
+
+    def on_flush(user_ids):
+        if router is not None:
+            router.note_writes(user_ids)
+        cache.bump_versions(user_ids)
+
+    return WriteBehindBuffer(engine, on_flush=on_flush, **settings)
+
+def render_metrics():
+    """Prometheus text for the query, pool, data cache and replica metrics"""
+    router = get_replica_router()
+    return render_prometheus(METRICS, cache_stats=get_data_cache().stats(),
+                             engine=get_database_connection(),
+                             replica_stats=router.stats() if router is not None else None)
+
+@st.cache_resource
+def get_metrics_server():
+    """Start the /metrics endpoint once per process when METRICS_PORT is set"""
+    port = os.environ.get("METRICS_PORT")
+    if not port:
+        return None
+    try:
+        # Captured now: cached resources are not reachable from the server thread
+        cache, engine, router = get_data_cache(), get_database_connection(), get_replica_router()
+        return start_metrics_server(int(port), lambda: render_prometheus(
+            METRICS, cache_stats=cache.stats(), engine=engine,
+            replica_stats=router.stats() if router is not None else None
+        ))
+    except Exception as e:
+        print(f"❌ Could not start metrics server: {str(e)}")
+        return None
+
 def add_transaction(transaction_type, category, amount, description=""):
-    """Add a new transaction to database"""
+    """Add a new transaction of `amount` rupees to database"""
     engine = get_database_connection()
     if engine is None:
         return False
     
     try:
+        buffer = get_write_buffer()
+        if buffer is not None:
+            future = buffer.submit(st.session_state.user_id, transaction_type, category,
+                                   to_paise(amount), description)
+            # In sync mode wait for the group commit; the flush invalidates the cache
+            if buffer.durability == "sync":
+                future.result(timeout=30)
+            return True
+        
         with engine.connect() as conn:
-            conn.execute(text("""
-                INSERT INTO transactions (user_id, type, category, amount, description)
-                VALUES (:user_id, :type, :category, :amount, :description)
-            """), {
+            # The backend updates the daily rollup together with the insert
+            get_backend(conn).insert_transaction(conn, {
                 'user_id': st.session_state.user_id,
                 'type': transaction_type,
                 'category': category,
-                'amount': float(amount),
+                'amount': to_paise(amount),
                 'description': description
             })
             conn.commit()
@@ -380,131 +493,280 @@ def add_transaction(transaction_type, category, amount, description=""):
         st.error(f"Error adding transaction: {str(e)}")
         return False
 
-def clear_data_cache():
-    """Clear all cached data"""
-    try:
-        get_transactions.clear()
-        get_summary.clear()
-        get_category_summary.clear()
-        get_daily_summary.clear()
-    except Exception as e:
-        st.error(f"Error clearing cache: {str(e)}")
+# Safety-net expiry for cached results; writes invalidate through the data version.
+# While the change listener is connected entries live for CACHE_PUSH_TTL instead.
+CACHE_TTL_SECONDS = 10
+# Rows per page for keyset-paginated reads
+TRANSACTIONS_PAGE_SIZE = 50
+# Rows fetched per round trip when streaming from a server-side cursor
+STREAM_BATCH_SIZE = 1000
+
+def row_to_transaction(row):
+    """Convert a transactions row into the dict shape used by the pages"""
+    return {
+        'id': row[0],
+        'type': row[1],
+        'category': row[2],
+        'amount': int(row[3]),
+        'description': row[4],
+        'created_at': row[5]
+    }
 
-@st.cache_data(ttl=10)  # Cache for 10 seconds
-def get_transactions():
-    """Get all transactions from database"""
+def build_transaction_filters(user_id, transaction_type=None, category=None, since=None):
+    """Build the WHERE clause and parameters for the transaction filters"""
+    conditions = ["user_id = :user_id"]
+    params = {'user_id': user_id}
+    
+    if transaction_type:
+        conditions.append("type = :type")
+        params['type'] = transaction_type
+    
+    if category:
+        conditions.append("category = :category")
+        params['category'] = category
+    
+    if since is not None:
+        conditions.append("created_at >= :since")
+        params['since'] = since
+    
+    return " AND ".join(conditions), params
+
+@cached_per_user(get_data_cache, ttl=CACHE_TTL_SECONDS)
+def get_transactions_page(user_id, limit=TRANSACTIONS_PAGE_SIZE, after=None,
+                          transaction_type=None, category=None, since=None):
+    """Get one page of transactions, newest first.
+    
+    Pages are keyed on (created_at, id): pass the cursor returned with the
+    previous page as `after` to get the next one. Returns (transactions,
+    next_cursor), where next_cursor is None on the last page. The optional
+    type, category and since filters are applied in SQL.
+    """
     engine = get_database_connection()
     if engine is None:
-        return []
+        return fallback(([], None))
+    
+    where, params = build_transaction_filters(user_id, transaction_type, category, since)
+    params['limit'] = limit + 1
+    if after is not None:
+        where += " AND (created_at, id) < (:after_created_at, :after_id)"
+        params['after_created_at'], params['after_id'] = after
     
     try:
-        with engine.connect() as conn:
-            result = conn.execute(text("""
+        with read_connection(user_id) as conn:
+            result = execute_statement(conn, f"""
                 SELECT id, type, category, amount, description, created_at
                 FROM transactions
-                WHERE user_id = :user_id
-                ORDER BY created_at DESC
-            """), {'user_id': st.session_state.user_id})
+                WHERE {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT :limit
+            """, params)
             
-            transactions = []
-            for row in result:
-                transactions.append({
-                    'id': row[0],
-                    'type': row[1],
-                    'category': row[2],
-                    'amount': float(row[3]),
-                    'description': row[4],
-                    'created_at': row[5]
-                })
-            
-            return transactions
+            transactions = [row_to_transaction(row) for row in result]
+        
+        # One extra row was fetched to learn whether another page exists
+        next_cursor = None
+        if len(transactions) > limit:
+            transactions = transactions[:limit]
+            last = transactions[-1]
+            next_cursor = (last['created_at'], last['id'])
+        
+        return transactions, next_cursor
     except Exception as e:
         st.error(f"Error fetching transactions: {str(e)}")
-        return []
+        return fallback(([], None))
 
-@st.cache_data(ttl=10)  # Cache for 10 seconds
-def get_summary():
-    """Get income and expense summary"""
+@cached_per_user(get_data_cache, ttl=CACHE_TTL_SECONDS)
+def search_transactions_page(user_id, query, offset=0, limit=TRANSACTIONS_PAGE_SIZE,
+                             transaction_type=None, category=None, since=None):
+    """Get one page of transactions matching a search query, best match first.
+    
+    Returns (transactions, next_offset), where next_offset is None on the
+    last page. The type, category and since filters narrow the search.
+    """
     engine = get_database_connection()
     if engine is None:
-        return 0, 0
+        return fallback(([], None))
+    
+    where, params = build_transaction_filters(user_id, transaction_type, category, since)
     
     try:
-        with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT 
-                    SUM(CASE WHEN type = 'Income' THEN amount ELSE 0 END) as income,
-                    SUM(CASE WHEN type = 'Expense' THEN amount ELSE 0 END) as expense
-                FROM transactions
-                WHERE user_id = :user_id
-            """), {'user_id': st.session_state.user_id}).fetchone()
-            
-            income = float(result[0] or 0)
-            expense = float(result[1] or 0)
-            return income, expense
+        with read_connection(user_id) as conn:
+            rows = search_transactions(conn, query, where, params, limit + 1, offset)
+        
+        transactions = [row_to_transaction(row) for row in rows]
+        # One extra row was fetched to learn whether another page exists
+        if len(transactions) > limit:
+            return transactions[:limit], offset + limit
+        return transactions, None
     except Exception as e:
-        st.error(f"Error getting summary: {str(e)}")
-        return 0, 0
+        st.error(f"Error searching transactions: {str(e)}")
+        return fallback(([], None))
 
-@st.cache_data(ttl=10)  # Cache for 10 seconds
-def get_category_summary():
-    """Get summary by category"""
+@cached_per_user(get_data_cache, ttl=CACHE_TTL_SECONDS, shared=True)
+def get_transaction_count(user_id, transaction_type=None, category=None, since=None):
+    """Count the transactions matching the filters"""
     engine = get_database_connection()
     if engine is None:
-        return []
+        return fallback(0)
+    
+    where, params = build_transaction_filters(user_id, transaction_type, category, since)
     
     try:
-        with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT category, type, SUM(amount) as total_amount
-                FROM transactions
-                WHERE user_id = :user_id
-                GROUP BY category, type
-                ORDER BY total_amount DESC
-            """), {'user_id': st.session_state.user_id})
+        with read_connection(user_id) as conn:
+            result = execute_statement(conn, f"""
+                SELECT COUNT(*) FROM transactions WHERE {where}
+            """, params).fetchone()
+            return int(result[0])
+    except Exception as e:
+        st.error(f"Error counting transactions: {str(e)}")
+        return fallback(0)
+
+@cached_per_user(get_data_cache, ttl=CACHE_TTL_SECONDS)
+def get_categories(user_id):
+    """Get the distinct categories a user has used.
+    
+    Walks idx_transactions_user_category with a recursive loose index scan,
+    so the cost is one index probe per category rather than a scan of the
+    user's whole history.
+    """
+    engine = get_database_connection()
+    if engine is None:
+        return fallback([])
+    
+    try:
+        with read_connection(user_id) as conn:
+            if get_backend(conn).embedded:
+                # SQLite plans DISTINCT over the index as a skip scan already
+                result = conn.execute(text("""
+                    SELECT DISTINCT category FROM transactions
+                    WHERE user_id = :user_id
+                    ORDER BY category
+                """), {'user_id': user_id})
+                return [row[0] for row in result]
             
-            categories = []
-            for row in result:
-                categories.append((row[0], row[1], float(row[2])))
+            result = execute_statement(conn, """
+                WITH RECURSIVE categories AS (
+                    (SELECT category FROM transactions
+                     WHERE user_id = :user_id
+                     ORDER BY category LIMIT 1)
+                    UNION ALL
+                    SELECT (SELECT t.category FROM transactions t
+                            WHERE t.user_id = :user_id AND t.category > c.category
+                            ORDER BY t.category LIMIT 1)
+                    FROM categories c
+                    WHERE c.category IS NOT NULL
+                )
+                SELECT category FROM categories WHERE category IS NOT NULL
+            """, {'user_id': user_id})
             
-            return categories
+            return [row[0] for row in result]
     except Exception as e:
-        st.error(f"Error getting category summary: {str(e)}")
-        return []
+        st.error(f"Error getting categories: {str(e)}")
+        return fallback([])
 
-@st.cache_data(ttl=10)  # Cache for 10 seconds
-def get_daily_summary():
-    """Get daily transaction summary for the last 30 days"""
+def iter_transaction_rows(user_id, batch_size=STREAM_BATCH_SIZE):
+    """Stream raw transaction rows, newest first, in batches from a server-side cursor.
+    
+    Only one batch is held in memory at a time, so this is the read path for
+    callers that genuinely need the whole history (exports, full analytics).
+    """
     engine = get_database_connection()
     if engine is None:
-        return []
+        return
+    
+    with read_connection(user_id) as conn:
+        result = conn.execution_options(
+            stream_results=True,
+            max_row_buffer=batch_size
+        ).execute(text("""
+            SELECT id, type, category, amount, description, created_at
+            FROM transactions
+            WHERE user_id = :user_id
+            ORDER BY created_at DESC, id DESC
+        """), {'user_id': user_id})
+        
+        for batch in result.partitions(batch_size):
+            yield batch
+
+@cached_per_user(get_data_cache, ttl=CACHE_TTL_SECONDS)
+def get_ledger_frame(user_id):
+    """Get the user's history as a typed LedgerFrame, built once per data version"""
+    engine = get_database_connection()
+    if engine is None:
+        return fallback(build_ledger_frame([]))
     
     try:
-        with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT 
-                    DATE(created_at) as date,
-                    type,
-                    SUM(amount) as total_amount
-                FROM transactions
-                WHERE user_id = :user_id 
-                    AND created_at >= NOW() - INTERVAL '30 days'
-                GROUP BY DATE(created_at), type
-                ORDER BY date DESC
-            """), {'user_id': st.session_state.user_id})
-            
-            daily_data = []
-            for row in result:
-                daily_data.append({
-                    'date': row[0],
-                    'type': row[1],
-                    'amount': float(row[2])
-                })
+        return build_ledger_frame(iter_transaction_rows(user_id))
+    except Exception as e:
+        st.error(f"Error fetching transactions: {str(e)}")
+        return fallback(build_ledger_frame([]))
+
+@cached_per_user(get_data_cache, ttl=CACHE_TTL_SECONDS, shared=True)
+def get_analytics(user_id):
+    """Get the Analytics page aggregates, computed once per data version"""
+    try:
+        return compute_analytics(get_ledger_frame(user_id))
+    except Exception as e:
+        st.error(f"Error computing analytics: {str(e)}")
+        return fallback(LedgerAnalytics())
+
+@cached_per_user(get_data_cache, ttl=CACHE_TTL_SECONDS, shared=True)
+def get_dashboard_snapshot(user_id, recent_limit=5):
+    """Get totals, category sums, the 30-day series and recent rows in one round trip"""
+    engine = get_database_connection()
+    if engine is None:
+        return fallback(DashboardSnapshot())
+    
+    try:
+        with read_connection(user_id) as conn:
+            return load_dashboard_snapshot(conn, user_id, recent_limit)
+    except Exception as e:
+        st.error(f"Error loading dashboard: {str(e)}")
+        return fallback(DashboardSnapshot())
+
+@cached_per_user(get_data_cache, ttl=CACHE_TTL_SECONDS, shared=True)
+def get_balance_history(user_id):
+    """Get daily income and expense totals over the user's whole history, oldest first"""
+    engine = get_database_connection()
+    if engine is None:
+        return fallback([])
+    
+    try:
+        with read_connection(user_id) as conn:
+            result = execute_statement(conn, """
+                SELECT day, type, SUM(total) as total_amount
+                FROM daily_rollups
+                WHERE user_id = :user_id
+                GROUP BY day, type
+                HAVING SUM(count) > 0
+                ORDER BY day
+            """, {'user_id': user_id})
             
-            return daily_data
+            return [{'date': row[0], 'type': row[1], 'amount': int(row[2])} for row in result]
     except Exception as e:
-        st.error(f"Error getting daily summary: {str(e)}")
-        return []
+        st.error(f"Error getting balance history: {str(e)}")
+        return fallback([])
+
+@cached_per_user(get_data_cache, ttl=CACHE_TTL_SECONDS)
+def get_chart(user_id, chart, max_points=MAX_CHART_POINTS):
+    """Get one of the user's Plotly figures, built once per data version"""
+    if chart == 'daily_balance':
+        return daily_balance_figure(get_dashboard_snapshot(user_id).daily_summary, max_points)
+    if chart == 'income_vs_expense':
+        snapshot = get_dashboard_snapshot(user_id)
+        return income_expense_figure(snapshot.income, snapshot.expense)
+    if chart == 'balance_history':
+        return daily_balance_figure(get_balance_history(user_id), max_points,
+                                    title='💹 Balance Over Time')
+    if chart == 'monthly_trend':
+        return monthly_trend_figure(get_analytics(user_id).monthly, max_points)
+    if chart == 'expense_categories':
+        return category_figure(get_analytics(user_id).category_totals('Expense'),
+                               'Expenses by Category', px.colors.qualitative.Set3)
+    if chart == 'income_categories':
+        return category_figure(get_analytics(user_id).category_totals('Income'),
+                               'Income by Category', px.colors.qualitative.Set2)
+    raise ValueError(f"Unknown chart: {chart}")
 
 def clear_all_data():
     """Clear all user data"""
@@ -517,6 +779,9 @@ def clear_all_data():
             conn.execute(text("""
                 DELETE FROM transactions WHERE user_id = :user_id
             """), {'user_id': st.session_state.user_id})
+            conn.execute(text("""
+                DELETE FROM daily_rollups WHERE user_id = :user_id
+            """), {'user_id': st.session_state.user_id})
             conn.commit()
         
         # Clear cache after clearing data
@@ -529,88 +794,14 @@ def clear_all_data():
 
 
 
-def format_currency(amount):
-    """Format amount as Indian Rupees"""
-    return f"₹{amount:,.2f}"
-
-def get_spending_insights():
-    """Get spending insights and alerts"""
-    transactions = get_transactions()
-    if not transactions:
-        return []
-    
-    df = pd.DataFrame(transactions)
-    df['created_at'] = pd.to_datetime(df['created_at'])
-    
-    insights = []
-    
-    # This month vs last month spending
-    current_month = datetime.now().replace(day=1)
-    last_month = (current_month - timedelta(days=1)).replace(day=1)
-    
-    current_month_expenses = df[
-        (df['type'] == 'Expense') & 
-        (df['created_at'] >= current_month)
-    ]['amount'].sum()
-    
-    last_month_expenses = df[
-        (df['type'] == 'Expense') & 
-        (df['created_at'] >= last_month) & 
-        (df['created_at'] < current_month)
-    ]['amount'].sum()
-    
-    if last_month_expenses > 0:
-        change = ((current_month_expenses - last_month_expenses) / last_month_expenses) * 100
-        if change > 20:
-            insights.append({
-                'type': 'alert',
-                'title': '🚨 High Spending Alert!',
-                'message': f'Your spending increased by {change:.1f}% this month compared to last month.'
-            })
-        elif change < -20:
-            insights.append({
-                'type': 'success',
-                'title': '🎉 Great Savings!',
-                'message': f'You reduced spending by {abs(change):.1f}% this month. Keep it up!'
-            })
-    
-    # Top spending category
-    expense_df = df[df['type'] == 'Expense']
-    if not expense_df.empty:
-        top_category = expense_df.groupby('category')['amount'].sum().idxmax()
-        top_amount = expense_df.groupby('category')['amount'].sum().max()
-        total_expenses = expense_df['amount'].sum()
-        
-        if total_expenses > 0:
-            percentage = (top_amount / total_expenses) * 100
-            if percentage > 40:
-                insights.append({
-                    'type': 'insight',
-                    'title': f'💡 Top Spending: {top_category}',
-                    'message': f'{percentage:.1f}% of your expenses go to {top_category}. Consider budgeting for this category.'
-                })
-    
-    # Savings rate
-    income, expense = get_summary()
-    if income > 0:
-        savings_rate = ((income - expense) / income) * 100
-        if savings_rate > 20:
-            insights.append({
-                'type': 'success',
-                'title': '💰 Excellent Savings Rate!',
-                'message': f'You\'re saving {savings_rate:.1f}% of your income. Financial experts recommend 20%+.'
-            })
-        elif savings_rate < 10:
-            insights.append({
-                'type': 'alert',
-                'title': '⚠️ Low Savings Rate',
-                'message': f'Your savings rate is {savings_rate:.1f}%. Try to aim for at least 20% of your income.'
-            })
-    
-    return insights
+@cached_per_user(get_data_cache, ttl=CACHE_TTL_SECONDS, shared=True)
+def get_insights(user_id):
+    """Get spending insights and alerts, computed once per data version"""
+    return build_insights(insight_metrics(get_dashboard_snapshot(user_id)))
 
 def main():
     initialize_session_state()
+    get_metrics_server()
     
     # Check database connection
     if not st.session_state.db_initialized:
@@ -624,6 +815,8 @@ def main():
                 del st.session_state['db_initialized']
             st.rerun()
         return
+    ensure_upcoming_partitions()
+    get_change_listener()
 
     # Fixed refresh button
     if st.sidebar.button("🔄 Refresh Data"):
@@ -646,6 +839,7 @@ def main():
         "💰 Add Income": "Add Income", 
         "💸 Add Expense": "Add Expense",
         "📋 Transactions": "View Transactions",
+        "📥 Import": "Import",
         "🎯 Insights": "Insights",
         "📈 Analytics": "Analytics"
     }
@@ -653,9 +847,22 @@ def main():
     selected_nav = st.sidebar.selectbox("Choose a page", list(nav_options.keys()))
     page = nav_options[selected_nav]
     
-    # Get current summary
-    income, expense = get_summary()
-    balance = income - expense
+    # One round trip for everything the sidebar and dashboard pages show; a
+    # page with data of its own fetches it concurrently with the snapshot
+    user_id = st.session_state.user_id
+    page_loaders = {
+        "View Transactions": get_categories,
+        "Analytics": get_analytics
+    }
+    page_data = None
+    if page in page_loaders:
+        snapshot, page_data = fetch_concurrently(
+            lambda: get_dashboard_snapshot(user_id),
+            lambda: page_loaders[page](user_id)
+        )
+    else:
+        snapshot = get_dashboard_snapshot(user_id)
+    income, expense, balance = snapshot.income, snapshot.expense, snapshot.balance
     
     # Enhanced sidebar summary
     st.sidebar.markdown("---")
@@ -698,35 +905,104 @@ def main():
             else:
                 st.error("Failed to clear data.")
     
-    # Download functionality
-    transactions = get_transactions()
-    if transactions:
-        df = pd.DataFrame(transactions)
-        csv = df.to_csv(index=False)
-        st.sidebar.download_button(
-            label="📥 Download CSV",
-            data=csv,
-            file_name=f"budget_buddy_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
-        )
+    # Download functionality - the export is only generated on request
+    export_format = st.sidebar.selectbox("Export format", available_export_formats())
+    if st.sidebar.button("📦 Prepare Export"):
+        with st.spinner("Preparing export..."):
+            try:
+                extension, mime = EXPORT_FORMATS[export_format]
+                with export_transactions(
+                    iter_transaction_rows(st.session_state.user_id), export_format
+                ) as export_file:
+                    st.sidebar.download_button(
+                        label=f"📥 Download {export_format}",
+                        data=read_download(export_file),
+                        file_name=f"budget_buddy_{datetime.now().strftime('%Y%m%d')}.{extension}",
+                        mime=mime
+                    )
+            except Exception as e:
+                st.sidebar.error(f"Error preparing export: {str(e)}")
     
     # Route to different pages
     if page == "Dashboard":
-        show_dashboard(income, expense, balance)
+        show_dashboard(snapshot)
     elif page == "Add Income":
         show_add_income()
     elif page == "Add Expense":
         show_add_expense()
     elif page == "View Transactions":
-        show_transactions()
+        show_transactions(page_data)
     elif page == "Insights":
-        show_insights()
+        show_insights(snapshot)
+    elif page == "Import":
+        show_import()
     elif page == "Analytics":
-        show_analytics()
+        show_analytics(page_data)
+    
+    # Rendered last so it includes this rerun's queries
+    if env_flag("ADMIN_PANEL"):
+        show_admin_panel()
 
-def show_dashboard(income, expense, balance):
+def show_admin_panel():
+    """Sidebar panel with query, pool and data cache metrics"""
+    with st.sidebar.expander("🔧 Admin Metrics"):
+        queries = METRICS.query_summary()
+        if queries:
+            st.markdown("**Queries (slowest total first)**")
+            st.dataframe(pd.DataFrame(queries).round(2), use_container_width=True, hide_index=True)
+        else:
+            st.info("No queries recorded yet.")
+        
+        pool_wait = METRICS.pool_wait
+        st.markdown(
+            f"**Pool checkout wait:** {pool_wait.count} checkouts, "
+            f"p95 {pool_wait.quantile(0.95) * 1000:.2f} ms"
+        )
+        
+        cache_stats = get_data_cache().stats()
+        st.markdown(
+            f"**Data cache:** {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+            f"{cache_stats['evictions']} evictions, {cache_stats['bytes'] / 1024 / 1024:.1f} MiB"
+        )
+        if 'shared' in cache_stats:
+            shared_stats = cache_stats['shared']
+            st.markdown(
+                f"**Shared cache ({shared_stats['backend']}):** {shared_stats['hits']} hits, "
+                f"{shared_stats['misses']} misses, {shared_stats['errors']} errors"
+            )
+        listener = get_change_listener()
+        if listener is not None:
+            status = "connected" if listener.connected else "reconnecting"
+            st.markdown(
+                f"**Change listener:** {status}, {listener.notifications} notifications, "
+                f"{listener.reconnects} reconnects"
+            )
+        router = get_replica_router()
+        if router is not None:
+            replica_stats = router.stats()
+            st.markdown(f"**Reads on the primary:** {replica_stats['primary_reads']}")
+            for replica in replica_stats['replicas']:
+                status = "serving" if replica['healthy'] else "skipped"
+                lag = "unreachable" if replica['lag'] in (None, float('inf')) else f"lag {replica['lag']:.1f}s"
+                st.markdown(f"**Replica {replica['name']}:** {status}, {lag}, {replica['reads']} reads")
+        if cache_stats['functions']:
+            st.dataframe(pd.DataFrame.from_dict(cache_stats['functions'], orient='index'),
+                         use_container_width=True)
+        
+        st.download_button(
+            label="📥 Download Prometheus metrics",
+            data=render_metrics(),
+            file_name="budget_buddy_metrics.prom",
+            mime="text/plain"
+        )
+        if st.button("♻️ Reset query metrics"):
+            METRICS.reset()
+
+def show_dashboard(snapshot):
     st.header("🏠 Dashboard")
     
+    income, expense, balance = snapshot.income, snapshot.expense, snapshot.balance
+    
     # Enhanced metrics with animations
     col1, col2, col3 = st.columns(3)
     
@@ -766,27 +1042,9 @@ def show_dashboard(income, expense, balance):
         with col1:
             st.markdown('<div class="chart-container">', unsafe_allow_html=True)
             # Daily balance trend (last 30 days)
-            daily_data = get_daily_summary()
+            daily_data = snapshot.daily_summary
             if daily_data:
-                df_daily = pd.DataFrame(daily_data)
-                df_pivot = df_daily.pivot(index='date', columns='type', values='amount').fillna(0)
-                df_pivot['balance'] = df_pivot.get('Income', 0) - df_pivot.get('Expense', 0)
-                df_pivot['cumulative_balance'] = df_pivot['balance'].cumsum()
-                
-                fig_trend = px.line(
-                    x=df_pivot.index,
-                    y=df_pivot['cumulative_balance'],
-                    title='💹 Daily Balance Trend (Last 30 Days)',
-                    labels={'x': 'Date', 'y': 'Balance (₹)'}
-                )
-                fig_trend.update_layout(
-                    height=400,
-                    showlegend=False,
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)'
-                )
-                fig_trend.update_traces(line_color='#667eea', line_width=3)
-                st.plotly_chart(fig_trend, use_container_width=True)
+                st.plotly_chart(get_chart(st.session_state.user_id, 'daily_balance'), use_container_width=True)
             else:
                 st.info("📊 Add more transactions to see the trend chart.")
             st.markdown('</div>', unsafe_allow_html=True)
@@ -795,29 +1053,16 @@ def show_dashboard(income, expense, balance):
             st.markdown('<div class="chart-container">', unsafe_allow_html=True)
             # Enhanced income vs expenses pie chart
             if income > 0 and expense > 0:
-                fig_pie = px.pie(
-                    values=[income, expense],
-                    names=['Income', 'Expenses'],
-                    title='📊 Income vs Expenses',
-                    color_discrete_map={'Income': '#10b981', 'Expenses': '#ef4444'}
-                )
-                fig_pie.update_layout(
-                    height=400,
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)'
-                )
-                fig_pie.update_traces(textposition='inside', textinfo='percent+label')
-                st.plotly_chart(fig_pie, use_container_width=True)
+                st.plotly_chart(get_chart(st.session_state.user_id, 'income_vs_expense'), use_container_width=True)
             else:
                 st.info("📊 Add both income and expenses to see the chart.")
             st.markdown('</div>', unsafe_allow_html=True)
     
     # Recent transactions with better styling
     st.markdown("### 📋 Recent Transactions")
-    transactions = get_transactions()
+    recent_transactions = snapshot.recent_transactions
     
-    if transactions:
-        recent_transactions = transactions[:5]
+    if recent_transactions:
         for transaction in recent_transactions:
             icon = "💰" if transaction['type'] == 'Income' else "💸"
             color = "#10b981" if transaction['type'] == 'Income' else "#ef4444"
@@ -862,7 +1107,8 @@ def show_add_income():
             custom_category = st.text_input("Custom Category (optional)")
         
         with col2:
-            amount = st.number_input("Amount (₹)", min_value=0.01, value=100.00, step=0.01)
+            amount = st.number_input("Amount (₹)", min_value=0.01, max_value=MAX_AMOUNT_PAISE / 100,
+                                     value=100.00, step=0.01)
         
         description = st.text_area("Description (Optional)", placeholder="Additional details...")
         
@@ -876,7 +1122,7 @@ def show_add_income():
                 
                 if st.session_state.get('last_income_key') != transaction_key:
                     if add_transaction('Income', final_category, amount, description):
-                        st.success(f"✅ Successfully added income: {final_category} - {format_currency(amount)}")
+                        st.success(f"✅ Successfully added income: {final_category} - {format_currency(to_paise(amount))}")
                         st.session_state.last_income_key = transaction_key
                         st.balloons()
                     else:
@@ -906,7 +1152,8 @@ def show_add_expense():
             custom_category = st.text_input("Custom Category (optional)")
         
         with col2:
-            amount = st.number_input("Amount (₹)", min_value=0.01, value=100.00, step=0.01)
+            amount = st.number_input("Amount (₹)", min_value=0.01, max_value=MAX_AMOUNT_PAISE / 100,
+                                     value=100.00, step=0.01)
         
         description = st.text_area("Description (Optional)", placeholder="Additional details...")
         
@@ -920,7 +1167,7 @@ def show_add_expense():
                 
                 if st.session_state.get('last_expense_key') != transaction_key:
                     if add_transaction('Expense', final_category, amount, description):
-                        st.success(f"✅ Successfully added expense: {final_category} - {format_currency(amount)}")
+                        st.success(f"✅ Successfully added expense: {final_category} - {format_currency(to_paise(amount))}")
                         st.session_state.last_expense_key = transaction_key
                     else:
                         st.error("❌ Failed to add expense. Please try again.")
@@ -929,57 +1176,59 @@ def show_add_expense():
             else:
                 st.error("❌ Please enter a valid category and amount.")
 
-def delete_transaction(transaction_id):
-    """Delete a transaction"""
+def delete_transactions(transaction_ids):
+    """Delete several of the user's transactions in one statement; returns the number deleted"""
+    if not transaction_ids:
+        return 0
+    
     engine = get_database_connection()
     if engine is None:
-        return False
+        return 0
     
     try:
         with engine.connect() as conn:
-            result = conn.execute(text("""
-                DELETE FROM transactions 
-                WHERE id = :id AND user_id = :user_id
-            """), {
-                'id': transaction_id,
-                'user_id': st.session_state.user_id
-            })
+            # The backend updates the daily rollups together with the delete
+            deleted_count = get_backend(conn).delete_transactions(
+                conn, st.session_state.user_id, transaction_ids
+            )
             conn.commit()
-            
-            if result.rowcount == 0:
-                st.warning("Transaction not found or already deleted.")
-                return False
-        
-        # Clear cache after deletion
-        clear_data_cache()
         
-        return True
-    except Exception as e:
-        st.error(f"Error deleting transaction: {str(e)}")
-        return False
+        if deleted_count < len(transaction_ids):
+            st.warning("Transaction not found or already deleted.")
         
-        # Clear cache and force refresh
-        clear_data_cache()
-        if 'data_loaded' in st.session_state:
-            del st.session_state['data_loaded']
-        st.session_state.data_loaded = True
+        if deleted_count:
+            # Clear cache after deletion
+            clear_data_cache()
         
-        return True
+        return deleted_count
     except Exception as e:
         st.error(f"Error deleting transaction: {str(e)}")
-        return False
+        return 0
 
-def show_transactions():
+def get_date_filter_cutoff(date_range):
+    """Translate a date filter option into the earliest created_at to include"""
+    # Minute precision keeps the cache key stable across quick reruns
+    now = datetime.now().replace(second=0, microsecond=0)
+    
+    if date_range == "Last 7 Days":
+        return now - timedelta(days=7)
+    elif date_range == "Last 30 Days":
+        return now - timedelta(days=30)
+    elif date_range == "This Month":
+        return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return None
+
+def show_transactions(categories):
     st.header("📋 All Transactions")
     
-    transactions = get_transactions()
+    user_id = st.session_state.user_id
     
-    if not transactions:
+    if not categories:
         st.info("📝 No transactions found. Add some income or expenses to get started.")
         return
     
-    df = pd.DataFrame(transactions)
-    df['created_at'] = pd.to_datetime(df['created_at']).dt.strftime('%d %b %Y %H:%M')
+    search_query = st.text_input("🔎 Search descriptions and categories",
+                                 placeholder="e.g. swiggy, rent, salary").strip()
     
     # Enhanced filter options
     col1, col2, col3 = st.columns(3)
@@ -988,80 +1237,146 @@ def show_transactions():
         transaction_type = st.selectbox("🔍 Filter by Type", ["All", "Income", "Expense"])
     
     with col2:
-        categories = ["All"] + sorted(list(df['category'].unique()))
-        selected_category = st.selectbox("📂 Filter by Category", categories)
+        selected_category = st.selectbox("📂 Filter by Category", ["All"] + categories)
     
     with col3:
         date_range = st.selectbox("📅 Filter by Date", ["All Time", "Last 7 Days", "Last 30 Days", "This Month"])
     
-    # Apply filters
-    filtered_df = df.copy()
-    
-    if transaction_type != "All":
-        filtered_df = filtered_df[filtered_df['type'] == transaction_type]
-    
-    if selected_category != "All":
-        filtered_df = filtered_df[filtered_df['category'] == selected_category]
+    # Filters are applied in SQL; "All" means no predicate
+    filters = {
+        'transaction_type': None if transaction_type == "All" else transaction_type,
+        'category': None if selected_category == "All" else selected_category,
+        'since': get_date_filter_cutoff(date_range)
+    }
     
-    # Date filtering - FIXED: Convert back to datetime for filtering
-    if date_range != "All Time":
-        # Get original datetime data for filtering
-        original_df = pd.DataFrame(transactions)
-        original_df['created_at'] = pd.to_datetime(original_df['created_at'])
-        
-        now = datetime.now()
+    # Cursors of the pages visited so far (keyset cursors when browsing,
+    # result offsets when searching); start over when the filters change
+    filter_key = (search_query, transaction_type, selected_category, date_range)
+    if st.session_state.get('transactions_filter_key') != filter_key:
+        st.session_state.transactions_filter_key = filter_key
+        st.session_state.transactions_page_cursors = [None]
+    page_cursors = st.session_state.transactions_page_cursors
+    
+    if search_query:
+        page_transactions, next_cursor = search_transactions_page(
+            user_id, search_query, offset=page_cursors[-1] or 0, **filters
+        )
+        page_label = f"Page {len(page_cursors)}"
+        st.subheader(f"🔎 Results for \"{search_query}\"")
+    else:
+        total_count, (page_transactions, next_cursor) = fetch_concurrently(
+            lambda: get_transaction_count(user_id, **filters),
+            lambda: get_transactions_page(user_id, after=page_cursors[-1], **filters)
+        )
+        page_count = max(1, (total_count + TRANSACTIONS_PAGE_SIZE - 1) // TRANSACTIONS_PAGE_SIZE)
+        page_label = f"Page {len(page_cursors)} of {page_count}"
         
-        if date_range == "Last 7 Days":
-            cutoff = now - timedelta(days=7)
-        elif date_range == "Last 30 Days":
-            cutoff = now - timedelta(days=30)
-        elif date_range == "This Month":
-            cutoff = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        # Display results
+        st.subheader(f"📊 Transactions ({total_count} found)")
+    
+    if page_transactions:
+        page_df = pd.DataFrame(page_transactions)
         
-        # Filter original data and get IDs
-        filtered_ids = original_df[original_df['created_at'] >= cutoff]['id'].tolist()
-        filtered_df = filtered_df[filtered_df['id'].isin(filtered_ids)]
-    
-    # Display results
-    st.subheader(f"📊 Transactions ({len(filtered_df)} found)")
-    
-    if not filtered_df.empty:
-        # Create a more readable display with consistent currency formatting
-        display_df = filtered_df[['type', 'category', 'amount', 'created_at']].copy()
-        display_df['amount'] = display_df['amount'].apply(lambda x: format_currency(x))
-        display_df.columns = ['Type', 'Category', 'Amount', 'Date']
+        # One row per transaction of this page, indexed by id; only Select is editable
+        display_df = pd.DataFrame({
+            'Select': False,
+            'Type': page_df['type'],
+            'Category': page_df['category'],
+            'Amount': format_currency_series(page_df['amount']),
+            'Date': pd.to_datetime(page_df['created_at']).dt.strftime('%d %b %Y %H:%M')
+        })
+        display_df.index = page_df['id']
         
-        st.dataframe(display_df, use_container_width=True)
+        # A new key per data version, filter and page clears the checkboxes
+        # once a delete lands or other rows are shown
+        edited_df = st.data_editor(
+            display_df,
+            use_container_width=True,
+            hide_index=True,
+            disabled=['Type', 'Category', 'Amount', 'Date'],
+            column_config={'Select': st.column_config.CheckboxColumn("🗑️", default=False)},
+            key=f"transactions_grid_{get_data_cache().version(user_id)}_{hash(filter_key)}_{len(page_cursors)}"
+        )
+        selected_ids = [int(transaction_id) for transaction_id in edited_df.index[edited_df['Select']]]
         
-        # Delete transaction option - FIXED: Better handling
-        st.subheader("🗑️ Delete Transaction")
-        transaction_options = [f"{row['id']}: {row['category']} - {format_currency(row['amount'])} ({row['type']})" 
-                             for _, row in filtered_df.iterrows()]
+        # Page navigation
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            st.button("⬅️ Previous", disabled=len(page_cursors) == 1,
+                      on_click=page_cursors.pop)
+        with col2:
+            st.caption(page_label)
+        with col3:
+            st.button("Next ➡️", disabled=next_cursor is None,
+                      on_click=page_cursors.append, args=(next_cursor,))
         
-        if transaction_options:
-            selected_transaction = st.selectbox("Select transaction to delete", [""] + transaction_options)
-            
-            if selected_transaction:
-                col1, col2 = st.columns([1, 4])
-                with col1:
-                    if st.button("🗑️ Delete", type="secondary"):
-                        try:
-                            transaction_id = int(selected_transaction.split(':')[0])
-                            if delete_transaction(transaction_id):
-                                st.success("✅ Transaction deleted successfully!")
-                                st.rerun()
-                            else:
-                                st.error("❌ Failed to delete transaction.")
-                        except ValueError:
-                            st.error("❌ Invalid transaction selection.")
-                        except Exception as e:
-                            st.error(f"❌ Error: {str(e)}")
+        # Delete the rows ticked in the grid, in one statement
+        st.subheader("🗑️ Delete Transactions")
+        if st.button(f"🗑️ Delete selected ({len(selected_ids)})", type="secondary",
+                     disabled=not selected_ids):
+            deleted_count = delete_transactions(selected_ids)
+            if deleted_count:
+                st.success(f"✅ Deleted {deleted_count} transaction(s)!")
+                st.rerun()
+            else:
+                st.error("❌ Failed to delete transactions.")
     else:
         st.info("No transactions match the selected filters.")
-def show_insights():
+
+def show_import():
+    st.header("📥 Import Transactions")
+    
+    st.markdown(
+        "Upload a bank statement as **CSV**, **OFX/QFX** or **QIF**. CSV files need a date "
+        "column and an amount (or debit/credit) column; type, category and description are "
+        "optional. Rows you have already imported are skipped."
+    )
+    
+    uploaded_file = st.file_uploader("Statement file", type=["csv", "ofx", "qfx", "qif"])
+    
+    if uploaded_file is not None and st.button("📥 Import", use_container_width=True):
+        engine = get_database_connection()
+        if engine is None:
+            st.error("❌ Database connection is not available.")
+            return
+        
+        progress_bar = st.progress(0.0, text="Importing...")
+        
+        def report_progress(rows_parsed, total_rows, rows_per_second):
+            fraction = min(rows_parsed / max(total_rows, 1), 0.99)
+            progress_bar.progress(fraction, text=f"Processed {rows_parsed:,} rows ({rows_per_second:,.0f} rows/sec)")
+        
+        try:
+            result = import_statement(
+                engine,
+                st.session_state.user_id,
+                uploaded_file.getvalue(),
+                uploaded_file.name,
+                progress=report_progress
+            )
+        except Exception as e:
+            progress_bar.empty()
+            st.error(f"❌ Import failed: {str(e)}")
+            return
+        
+        progress_bar.progress(1.0, text="Import complete")
+        clear_data_cache()
+        
+        st.success(
+            f"✅ Imported {result.inserted:,} new transactions in {result.seconds:.1f}s "
+            f"({result.rows_per_second:,.0f} rows/sec)."
+        )
+        if result.duplicates:
+            st.info(f"⏭️ Skipped {result.duplicates:,} rows that were already imported.")
+        if result.rejected:
+            st.warning(f"⚠️ Rejected {result.rejected:,} invalid rows.")
+            for row_number, reason in result.rejection_samples:
+                st.caption(f"Row {row_number}: {reason}")
+
+def show_insights(snapshot):
     st.header("🎯 Financial Insights")
     
-    insights = get_spending_insights()
+    insights = get_insights(st.session_state.user_id)
     
     if not insights:
         st.info("📊 Add more transactions to get personalized insights!")
@@ -1093,8 +1408,8 @@ def show_insights():
     # Additional insights section
     st.subheader("📈 Spending Pattern Analysis")
     
-    # Get category summary for spending patterns
-    category_summary = get_category_summary()
+    # Category summary for spending patterns
+    category_summary = snapshot.category_summary
     
     if category_summary:
         # Separate income and expense categories
@@ -1125,84 +1440,42 @@ def show_insights():
                     </div>
                     ''', unsafe_allow_html=True)
 
-def show_analytics():
+def show_analytics(analytics):
     st.header("📈 Analytics")
     
-    transactions = get_transactions()
-    
-    if not transactions:
+    if analytics.empty:
         st.info("📊 No transactions found. Add some income or expenses to see analytics.")
         return
     
-    # Convert to DataFrame
-    df = pd.DataFrame(transactions)
-    df['created_at'] = pd.to_datetime(df['created_at'])
-    df['date'] = df['created_at'].dt.date
-    df['month'] = df['created_at'].dt.strftime('%Y-%m')
-    
     # Monthly trends
     st.subheader("📊 Monthly Trends")
-    monthly_data = df.groupby(['month', 'type'])['amount'].sum().reset_index()
+    monthly_data = analytics.monthly
     
     if not monthly_data.empty:
-        fig_monthly = px.line(
-            monthly_data, 
-            x='month', 
-            y='amount', 
-            color='type',
-            title='Monthly Income vs Expenses Trend',
-            color_discrete_map={'Income': '#10b981', 'Expense': '#ef4444'},
-            labels={'amount': 'Amount (₹)', 'month': 'Month'}
-        )
-        fig_monthly.update_layout(
-            height=400,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
-        st.plotly_chart(fig_monthly, use_container_width=True)
+        st.plotly_chart(get_chart(st.session_state.user_id, 'monthly_trend'), use_container_width=True)
+    
+    # Every day of the user's history, downsampled to MAX_CHART_POINTS
+    st.subheader("💹 Balance History")
+    st.plotly_chart(get_chart(st.session_state.user_id, 'balance_history'), use_container_width=True)
     
     # Category analysis
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("💸 Expense Categories")
-        expense_data = df[df['type'] == 'Expense'].groupby('category')['amount'].sum().reset_index()
+        expense_data = analytics.category_totals('Expense')
         
         if not expense_data.empty:
-            fig_expense = px.pie(
-                expense_data, 
-                values='amount', 
-                names='category',
-                title='Expenses by Category',
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            fig_expense.update_layout(
-                height=400,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)'
-            )
-            st.plotly_chart(fig_expense, use_container_width=True)
+            st.plotly_chart(get_chart(st.session_state.user_id, 'expense_categories'), use_container_width=True)
         else:
             st.info("No expense data available for chart.")
     
     with col2:
         st.subheader("💰 Income Categories")
-        income_data = df[df['type'] == 'Income'].groupby('category')['amount'].sum().reset_index()
+        income_data = analytics.category_totals('Income')
         
         if not income_data.empty:
-            fig_income = px.pie(
-                income_data, 
-                values='amount', 
-                names='category',
-                title='Income by Category',
-                color_discrete_sequence=px.colors.qualitative.Set2
-            )
-            fig_income.update_layout(
-                height=400,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)'
-            )
-            st.plotly_chart(fig_income, use_container_width=True)
+            st.plotly_chart(get_chart(st.session_state.user_id, 'income_categories'), use_container_width=True)
         else:
             st.info("No income data available for chart.")
     
@@ -1212,19 +1485,14 @@ def show_analytics():
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Total Transactions", len(df))
+        st.metric("Total Transactions", analytics.count)
     
     with col2:
-        avg_transaction = df['amount'].mean()
-        st.metric("Average Transaction", format_currency(avg_transaction))
+        st.metric("Average Transaction", format_currency(analytics.mean_amount))
     
     with col3:
-        if not df.empty:
-            largest_transaction = df.loc[df['amount'].idxmax()]
-            st.metric("Largest Transaction", format_currency(largest_transaction['amount']))
-            st.caption(f"{largest_transaction['category']} ({largest_transaction['type']})")
-        else:
-            st.metric("Largest Transaction", "N/A")
+        st.metric("Largest Transaction", format_currency(analytics.largest_amount))
+        st.caption(f"{analytics.largest_category} ({analytics.largest_type})")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
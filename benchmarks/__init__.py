@@ -0,0 +1,7 @@
+"""Reproducible benchmarks for Budget Buddy.
+
+`generate` builds a deterministic synthetic ledger and loads it into
+PostgreSQL; `run` times the data functions and page renders at several
+ledger sizes and writes the results as JSON; `compare` diffs two result
+files.
+"""
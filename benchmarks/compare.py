@@ -0,0 +1,61 @@
+"""Compare two benchmark result files.
+
+Prints the median of every measurement side by side and exits with 1 when
+any median got slower by more than the threshold.
+
+    python -m benchmarks.compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+"""
+import argparse
+import json
+import sys
+
+def medians(results):
+    """Flatten a result file into {(size, group, name, kind): median seconds}"""
+    flat = {}
+    for size, size_results in results['sizes'].items():
+        for group in ('functions', 'pages'):
+            for name, kinds in size_results.get(group, {}).items():
+                for kind, summary in kinds.items():
+                    flat[(size, group, name, kind)] = summary['median']
+    return flat
+
+def compare(baseline, candidate, threshold=0.2, min_seconds=0.001):
+    """Rows of (key, baseline, candidate, ratio, regressed) for measurements in both files"""
+    base, cand = medians(baseline), medians(candidate)
+    rows = []
+    for key in sorted(base.keys() & cand.keys()):
+        ratio = cand[key] / base[key] if base[key] else float('inf')
+        # Sub-millisecond timings are too noisy to flag
+        regressed = ratio > 1 + threshold and cand[key] >= min_seconds
+        rows.append((key, base[key], cand[key], ratio, regressed))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown before a measurement counts as a regression")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"{baseline.get('commit')} -> {candidate.get('commit')}")
+    regressions = 0
+    for (size, group, name, kind), base, cand, ratio, regressed in compare(baseline, candidate, args.threshold):
+        marker = "❌" if regressed else "  "
+        print(f"{marker} {size:>5} {group:<9} {name:<24} {kind:<4} "
+              f"{base * 1000:10.2f} ms {cand * 1000:10.2f} ms {ratio:6.2f}x")
+        regressions += regressed
+
+    if regressions:
+        print(f"❌ {regressions} regression(s) above {args.threshold:.0%}")
+        return 1
+    print("✅ No regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""Deterministic synthetic ledgers for benchmarking.
+
+The same seed, size and end date always produce the same rows. Amounts are
+log-normal around a typical value per category, category frequencies follow
+fixed weights, and timestamps are spread over the `days` before the end date,
+which is pinned rather than today so runs on different days load the same rows.
+
+    python -m benchmarks.generate --users 10 --rows 100000
+"""
+import argparse
+import sys
+from datetime import date, datetime, time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from db import create_database_engine
+from partitions import ensure_partitions
+from rollups import rebuild_rollups
+from storage import get_backend
+
+BENCHMARK_USER_PREFIX = "bench-user-"
+LEDGER_COLUMNS = ['user_id', 'type', 'category', 'amount', 'description', 'created_at']
+GENERATE_BATCH_SIZE = 100_000
+DEFAULT_SEED = 42
+DEFAULT_DAYS = 730
+DEFAULT_END_DATE = date(2026, 1, 1)
+# Share of rows that are income
+INCOME_SHARE = 0.08
+
+# category: (relative frequency, median amount in ₹, log-normal sigma)
+EXPENSE_CATEGORIES = {
+    "Food": (20, 350, 0.7),
+    "Groceries": (16, 900, 0.6),
+    "Transportation": (10, 200, 0.8),
+    "Shopping": (9, 1500, 0.9),
+    "Fuel": (7, 1500, 0.4),
+    "Entertainment": (6, 600, 0.8),
+    "Utilities": (5, 2000, 0.5),
+    "Bills": (5, 1200, 0.5),
+    "Subscription": (4, 400, 0.5),
+    "Healthcare": (3, 1500, 1.0),
+    "Travel": (3, 8000, 0.9),
+    "Rent": (3, 18000, 0.3),
+    "Education": (2, 5000, 0.8),
+    "Insurance": (1, 6000, 0.5),
+    "Other": (6, 500, 1.0),
+}
+INCOME_CATEGORIES = {
+    "Salary": (55, 60000, 0.3),
+    "Freelance": (20, 15000, 0.8),
+    "Investment": (8, 8000, 1.0),
+    "Interest": (7, 1200, 0.6),
+    "Bonus": (4, 30000, 0.5),
+    "Rental": (6, 15000, 0.3),
+}
+
+def benchmark_user_id(index):
+    """User id of the index-th synthetic user"""
+    return f"{BENCHMARK_USER_PREFIX}{index:04d}"
+
+def sample_categories(rng, categories, size):
+    """Pick categories by weight and draw a log-normal amount (in paise) for each"""
+    names = list(categories)
+    weights = np.array([categories[name][0] for name in names], dtype='float64')
+    picks = rng.choice(len(names), size=size, p=weights / weights.sum())
+    medians = np.array([categories[name][1] for name in names], dtype='float64')[picks]
+    sigmas = np.array([categories[name][2] for name in names], dtype='float64')[picks]
+    paise = np.round(medians * 100 * np.exp(rng.standard_normal(size) * sigmas)).astype('int64')
+    return np.array(names, dtype=object)[picks], np.clip(paise, 100, 999_999_900)
+
+def ledger_months(end_date=DEFAULT_END_DATE, days=DEFAULT_DAYS):
+    """First day of every month `generate_ledger` can put a timestamp in"""
+    end = datetime.combine(end_date, time.min)
+    return pd.period_range(end - pd.Timedelta(days=days), end, freq='M').to_timestamp()
+
+def generate_ledger(users, rows, seed=DEFAULT_SEED, end_date=DEFAULT_END_DATE, days=DEFAULT_DAYS,
+                    batch_size=GENERATE_BATCH_SIZE):
+    """Yield DataFrames of `rows` synthetic transactions spread evenly over `users` users"""
+    end = datetime.combine(end_date, time.min)
+    span_seconds = days * 86_400
+    user_ids = np.array([benchmark_user_id(i) for i in range(users)], dtype=object)
+
+    for batch_index, start in enumerate(range(0, rows, batch_size)):
+        size = min(batch_size, rows - start)
+        # Seeding per batch keeps every batch reproducible on its own
+        rng = np.random.default_rng([seed, batch_index])
+
+        is_income = rng.random(size) < INCOME_SHARE
+        expense_categories, expense_amounts = sample_categories(rng, EXPENSE_CATEGORIES, size)
+        income_categories, income_amounts = sample_categories(rng, INCOME_CATEGORIES, size)
+        category = np.where(is_income, income_categories, expense_categories)
+        offsets = rng.integers(0, span_seconds, size)
+
+        yield pd.DataFrame({
+            'user_id': user_ids[np.arange(start, start + size) % users],
+            'type': np.where(is_income, 'Income', 'Expense'),
+            'category': category,
+            'amount': np.where(is_income, income_amounts, expense_amounts),
+            'description': pd.Series(category).str.lower() + ' payment',
+            'created_at': end - pd.to_timedelta(offsets, unit='s')
+        })
+
+def clear_benchmark_data(conn):
+    """Delete every synthetic user's transactions and rollups"""
+    pattern = f"{BENCHMARK_USER_PREFIX}%"
+    conn.execute(text("DELETE FROM transactions WHERE user_id LIKE :pattern"), {'pattern': pattern})
+    conn.execute(text("DELETE FROM daily_rollups WHERE user_id LIKE :pattern"), {'pattern': pattern})
+
+def load_ledger(engine, batches, months):
+    """Bulk-load generated batches into transactions and rebuild the users' rollups.
+
+    `months` must cover every row's month (see `ledger_months`): their
+    partitions are created before the first COPY, because creating one
+    waits for the open COPY transaction's lock on `transactions`. Expects
+    the schema to exist already. Returns the number of rows loaded.
+    """
+    with engine.begin() as conn:
+        ensure_partitions(conn, months)
+
+    loaded = 0
+    user_ids = set()
+    backend = get_backend(engine)
+    raw_connection = engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        for batch in batches:
+            backend.bulk_insert(cursor, 'transactions', LEDGER_COLUMNS, batch)
+            loaded += len(batch)
+            user_ids.update(batch['user_id'].unique())
+        raw_connection.commit()
+    finally:
+        raw_connection.close()
+
+    with engine.connect() as conn:
+        for user_id in sorted(user_ids):
+            rebuild_rollups(conn, user_id)
+        conn.commit()
+        conn.execute(text("ANALYZE transactions"))
+        conn.execute(text("ANALYZE daily_rollups"))
+        conn.commit()
+    return loaded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load a synthetic ledger into the database")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--rows", type=int, default=1000, help="Total rows across all users")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=DEFAULT_END_DATE,
+                        help=f"Newest day (default {DEFAULT_END_DATE})")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--keep", action="store_true", help="Keep existing synthetic users")
+    args = parser.parse_args(argv)
+
+    engine = create_database_engine()
+    if engine is None:
+        return 2
+
+    if not args.keep:
+        with engine.connect() as conn:
+            clear_benchmark_data(conn)
+            conn.commit()
+
+    loaded = load_ledger(engine, generate_ledger(
+        args.users, args.rows, seed=args.seed, end_date=args.end_date, days=args.days
+    ), ledger_months(args.end_date, args.days))
+    print(f"✅ Loaded {loaded} rows for {args.users} synthetic user(s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""Timed benchmarks of the data functions and page renders.
+
+For every ledger size the synthetic data is reloaded, then each data function
+is timed cold (with an empty data cache) and warm (served from it), and each
+page is rendered through Streamlit's AppTest with an empty and with a primed
+data cache. Results go to `benchmarks/results/<commit>.json`.
+
+    python -m benchmarks.run --sizes 1k 100k 1m
+    PREPARED_STATEMENTS=0 python -m benchmarks.run --output unprepared.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from streamlit.testing.v1 import AppTest
+
+from db import create_database_engine
+from migrations import migrate
+from statements import prepared_statements_enabled
+from benchmarks.generate import (
+    DEFAULT_END_DATE,
+    DEFAULT_SEED,
+    benchmark_user_id,
+    clear_benchmark_data,
+    generate_ledger,
+    ledger_months,
+    load_ledger,
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+SIZES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+PAGES = [
+    "🏠 Dashboard",
+    "💰 Add Income",
+    "💸 Add Expense",
+    "📋 Transactions",
+    "📥 Import",
+    "🎯 Insights",
+    "📈 Analytics",
+]
+APPTEST_TIMEOUT = 900
+
+# Runs inside the AppTest script thread, where the app's cached resources work
+BENCHMARK_SCRIPT = f"""
+import sys
+import time
+sys.path.insert(0, {REPO_ROOT!r})
+import streamlit as st
+import app
+
+def timings(func, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+mode = st.session_state.get('bench_mode')
+user_id = st.session_state.user_id
+
+if mode == 'functions':
+    repeat = st.session_state.bench_repeat
+    results = {{}}
+    # The data functions the pages call, with the arguments of a first visit
+    for func, args in ((app.get_dashboard_snapshot, ()), (app.get_transactions_page, ()),
+                       (app.get_transaction_count, ()), (app.search_transactions_page, ('food',)),
+                       (app.get_categories, ()), (app.get_ledger_frame, ()), (app.get_analytics, ()),
+                       (app.get_balance_history, ()), (app.get_insights, ())):
+        # Cleared every time, so the cached functions it calls are cold too
+        cold = timings(lambda: func.uncached(user_id, *args), repeat, setup=app.get_data_cache().clear)
+        # Fill the cache the cold samples left empty
+        func(user_id, *args)
+        results[func.__name__] = {{
+            'cold': cold,
+            'warm': timings(lambda: func(user_id, *args), repeat)
+        }}
+    st.session_state.bench_results = results
+elif mode == 'page':
+    if st.session_state.get('bench_cold'):
+        app.get_data_cache().clear()
+    started = time.perf_counter()
+    app.main()
+    st.session_state.bench_seconds = time.perf_counter() - started
+else:
+    app.main()
+"""
+
+def summarize(samples):
+    """min/median/mean of a list of timings, in seconds"""
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'repeat': len(samples)
+    }
+
+def new_app_test(user_id):
+    at = AppTest.from_string(BENCHMARK_SCRIPT, default_timeout=APPTEST_TIMEOUT)
+    at.session_state['user_id'] = user_id
+    return at
+
+def check_app_test(at):
+    if at.exception:
+        raise RuntimeError(f"App raised: {at.exception[0].value}")
+    return at
+
+def benchmark_functions(user_id, repeat):
+    """Cold and warm timings of the data functions"""
+    at = new_app_test(user_id)
+    at.session_state['bench_mode'] = 'functions'
+    at.session_state['bench_repeat'] = repeat
+    check_app_test(at.run())
+    return {
+        name: {kind: summarize(samples) for kind, samples in result.items()}
+        for name, result in at.session_state['bench_results'].items()
+    }
+
+def benchmark_pages(user_id, repeat):
+    """Render time of every page with an empty and with a primed data cache"""
+    results = {}
+    for page in PAGES:
+        at = new_app_test(user_id)
+        check_app_test(at.run())
+        at.sidebar.selectbox[0].select(page)
+        at.session_state['bench_mode'] = 'page'
+
+        page_results = {}
+        for kind, cold in (('cold', True), ('warm', False)):
+            at.session_state['bench_cold'] = cold
+            samples = []
+            for _ in range(repeat):
+                check_app_test(at.run())
+                samples.append(at.session_state['bench_seconds'])
+            page_results[kind] = summarize(samples)
+        results[page.split(" ", 1)[1]] = page_results
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def run_benchmarks(engine, sizes, repeat, seed=DEFAULT_SEED, users=1, end_date=DEFAULT_END_DATE):
+    """Load each ledger size and benchmark it; returns the results dict"""
+    migrate(engine)
+
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            server_version = conn.execute(text("SELECT 'sqlite ' || sqlite_version()")).scalar()
+        else:
+            server_version = conn.execute(text("SHOW server_version")).scalar()
+
+    results = {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'backend': engine.dialect.name,
+        'server_version': server_version,
+        'seed': seed,
+        'users': users,
+        'end_date': end_date.isoformat(),
+        'prepared_statements': prepared_statements_enabled(),
+        'sizes': {}
+    }
+
+    for label in sizes:
+        rows = SIZES[label]
+        print(f"⏱️ {label}: loading {rows} rows...")
+        with engine.connect() as conn:
+            clear_benchmark_data(conn)
+            conn.commit()
+        started = time.perf_counter()
+        load_ledger(engine, generate_ledger(users, rows, seed=seed, end_date=end_date),
+                    ledger_months(end_date))
+        load_seconds = time.perf_counter() - started
+
+        user_id = benchmark_user_id(0)
+        print(f"⏱️ {label}: data functions...")
+        functions = benchmark_functions(user_id, repeat)
+        print(f"⏱️ {label}: pages...")
+        pages = benchmark_pages(user_id, repeat)
+
+        results['sizes'][label] = {
+            'rows': rows,
+            'load_seconds': load_seconds,
+            'functions': functions,
+            'pages': pages
+        }
+
+    with engine.connect() as conn:
+        clear_benchmark_data(conn)
+        conn.commit()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the data functions and pages")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--users", type=int, default=1,
+                        help="Spread each size over this many users (the first one is measured)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=DEFAULT_END_DATE,
+                        help=f"Newest day of the synthetic ledger (default {DEFAULT_END_DATE})")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/<commit>.json)")
+    args = parser.parse_args(argv)
+
+    engine = create_database_engine()
+    if engine is None:
+        return 2
+
+    results = run_benchmarks(engine, args.sizes, args.repeat, seed=args.seed, users=args.users,
+                             end_date=args.end_date)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""Per-user, version-keyed, memory-bounded cache for the data functions.
+
+Entries are keyed by (function, user_id, data version, arguments). A write
+bumps only that user's version, so their stale entries stop matching and are
+dropped, while every other user's cached data stays hot. The cache evicts
+least recently used entries once the estimated size passes its byte budget
+and keeps hit/miss/eviction counters per function.
+
+Functions cached with `shared=True` also use the optional shared tier (see
+shared_cache.py) that every replica reads: a miss here looks there before
+running the query, and a computed result is stored in both. An error from the
+shared tier is logged and treated as a miss, and the tier is skipped for
+SHARED_RETRY_INTERVAL seconds so an unreachable server does not slow every
+request. Writes made meanwhile cannot invalidate it, so after an outage its
+entries may be stale for up to their TTL.
+
+While a change listener (see invalidation.py) is connected it sets
+`push_ttl`, and entries stored with a TTL live that long instead, because the
+listener bumps versions as soon as any process writes. A listener bumps only
+local versions and leaves the shared tier to the writer, so for
+SHARED_SETTLE_INTERVAL seconds after such a bump that user's reads skip the
+shared tier rather than find an entry it has not invalidated yet.
+
+A data function returns its error fallback through `fallback(value)`. That
+result, and any cached result computed from it, is returned but stored in
+neither tier, so the next call queries again instead of serving the empty
+default for the whole TTL.
+"""
+import dataclasses
+import functools
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from db import env_int
+from metrics import query_label
+from shared_cache import dumps, entry_key, loads
+
+# Default byte budget for the process-wide data cache (64 MiB)
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# After a shared tier error it is skipped for this long (seconds)
+SHARED_RETRY_INTERVAL = 30
+# After a local-only version bump the user's reads skip the shared tier this long (seconds)
+SHARED_SETTLE_INTERVAL = 5
+
+# Whether the result being computed in this thread is an error fallback
+_computing = threading.local()
+
+def fallback(value):
+    """Return `value` from a cached function without caching it"""
+    _computing.fallback = True
+    return value
+
+def get_cache_max_bytes():
+    """Byte budget from DATA_CACHE_MAX_BYTES, falling back to the default"""
+    return env_int("DATA_CACHE_MAX_BYTES", DEFAULT_CACHE_MAX_BYTES)
+
+def estimate_size(value, _seen=None):
+    """Rough deep size of a cached value in bytes"""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    # Plotly figures: size of their data and layout
+    if hasattr(value, "to_plotly_json"):
+        return estimate_size(value.to_plotly_json(), _seen)
+    # DataFrames, Series and Arrow tables know their own footprint
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    if hasattr(value, "nbytes") and not isinstance(value, (bytes, bytearray)):
+        return int(value.nbytes)
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in value)
+    elif dataclasses.is_dataclass(value) and not isinstance(value, type):
+        size += sum(estimate_size(getattr(value, f.name), _seen) for f in dataclasses.fields(value))
+    return size
+
+class DataCache:
+    """Thread-safe LRU cache of per-user results with a byte budget"""
+
+    def __init__(self, max_bytes=None, shared=None):
+        self.max_bytes = max_bytes if max_bytes is not None else get_cache_max_bytes()
+        # Optional cross-replica tier (SQLiteSharedCache or RedisSharedCache)
+        self.shared = shared
+        self.current_bytes = 0
+        self._lock = threading.RLock()
+        # key -> (value, size, expires_at); ordered from least to most recently used
+        self._entries = OrderedDict()
+        # user_id -> keys cached for that user, so a version bump can drop them
+        self._user_keys = {}
+        self._versions = {}
+        # key -> lock held while one caller computes a missing entry
+        self._inflight = {}
+        # user_id -> monotonic time until which their reads skip the shared tier
+        self._settling = {}
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = Counter()
+        self.shared_hits = Counter()
+        self.shared_misses = Counter()
+        self.shared_errors = 0
+        self._shared_retry_at = 0.0
+        # Set by a connected ChangeListener; None falls back to each function's TTL
+        self.push_ttl = None
+
+    def version(self, user_id):
+        """Current data version of a user"""
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def bump_version(self, user_id, shared=True):
+        """Invalidate one user's cached data after a write, here and (with `shared`) in the shared tier"""
+        return self.bump_versions([user_id], shared)[user_id]
+
+    def bump_versions(self, user_ids, shared=True):
+        """Invalidate several users' cached data at once; returns their new versions"""
+        # Shared tier first, and outside the lock so its round trips do not
+        # stall other sessions; a local miss after the local bump must not
+        # find the old shared entry
+        if shared and self.shared is not None:
+            for user_id in user_ids:
+                self._shared_call(self.shared.bump_version, user_id)
+        now = time.monotonic()
+        with self._lock:
+            if not shared and self.shared is not None:
+                # Another process replaces the shared versions, maybe a moment later
+                self._settling = {
+                    user_id: until for user_id, until in self._settling.items() if until > now
+                }
+                for user_id in user_ids:
+                    self._settling[user_id] = now + SHARED_SETTLE_INTERVAL
+            for user_id in user_ids:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                for key in self._user_keys.pop(user_id, ()):
+                    self._remove(key)
+            return {user_id: self._versions[user_id] for user_id in user_ids}
+
+    def clear(self):
+        """Drop every entry (the counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+            self.current_bytes = 0
+
+    def get_or_compute(self, name, user_id, args, compute, ttl=None, shared=False):
+        """Return the cached result for `name(user_id, *args)`, computing it on a miss.
+
+        Concurrent misses on the same key wait for the first caller instead
+        of all querying the database at once. With `shared`, a miss is looked
+        up in the shared tier before computing.
+        """
+        key = (name, user_id, self.version(user_id), args)
+
+        found, value = self._lookup(key)
+        if found:
+            self.hits[name] += 1
+            return value
+
+        with self._lock:
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+
+        with key_lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits[name] += 1
+                return value
+
+            self.misses[name] += 1
+            try:
+                # shared_key is None when the shared tier is off or unavailable
+                shared_key, value = None, None
+                if shared and self.shared is not None and not self._shared_settling(user_id):
+                    shared_key, value = self._shared_lookup(name, user_id, args)
+                if value is None:
+                    value, is_fallback = self._compute(compute)
+                    if is_fallback:
+                        return value
+                    if shared_key is not None:
+                        self._shared_store(name, shared_key, user_id, value)
+                self._store(key, user_id, value, ttl)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+            return value
+
+    def stats(self):
+        """Counters and size, overall and per function"""
+        with self._lock:
+            names = set(self.hits) | set(self.misses) | set(self.evictions)
+            stats = {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': sum(self.hits.values()),
+                'misses': sum(self.misses.values()),
+                'evictions': sum(self.evictions.values()),
+                'functions': {
+                    name: {
+                        'hits': self.hits[name],
+                        'misses': self.misses[name],
+                        'evictions': self.evictions[name]
+                    }
+                    for name in sorted(names)
+                }
+            }
+            if self.shared is not None:
+                stats['shared'] = {
+                    'backend': self.shared.name,
+                    'hits': sum(self.shared_hits.values()),
+                    'misses': sum(self.shared_misses.values()),
+                    'errors': self.shared_errors
+                }
+                for name, counts in stats['functions'].items():
+                    counts['shared_hits'] = self.shared_hits[name]
+                    counts['shared_misses'] = self.shared_misses[name]
+            return stats
+
+    def _compute(self, compute):
+        """(result, whether it is or was built from an error fallback)"""
+        outer = getattr(_computing, 'fallback', False)
+        _computing.fallback = False
+        try:
+            value = compute()
+            is_fallback = _computing.fallback
+        finally:
+            _computing.fallback = outer
+        if is_fallback:
+            # A cached function calling this one must not cache its result either
+            _computing.fallback = True
+        return value, is_fallback
+
+    def _shared_call(self, method, *args):
+        """Call the shared tier; None if it failed or is being skipped after a failure"""
+        if time.monotonic() < self._shared_retry_at:
+            return None
+        try:
+            return method(*args)
+        except Exception as e:
+            with self._lock:
+                self.shared_errors += 1
+                self._shared_retry_at = time.monotonic() + SHARED_RETRY_INTERVAL
+            print(f"⚠️ Shared cache unavailable, using the local cache only for "
+                  f"{SHARED_RETRY_INTERVAL}s: {str(e)}")
+            return None
+
+    def _shared_settling(self, user_id):
+        """Whether the shared tier may not have seen `user_id`'s latest write yet"""
+        with self._lock:
+            until = self._settling.get(user_id)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self._settling[user_id]
+                return False
+            return True
+
+    def _shared_lookup(self, name, user_id, args):
+        """(shared key, cached value or None); the key is None if the tier could not be reached"""
+        version = self._shared_call(self.shared.version, user_id)
+        if version is None:
+            return None, None
+        shared_key = entry_key(name, user_id, version, args)
+        data = self._shared_call(self.shared.get, shared_key)
+        if data is None:
+            self.shared_misses[name] += 1
+            return shared_key, None
+        try:
+            value = loads(data)
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable shared cache entry for {name}: {str(e)}")
+            return shared_key, None
+        self.shared_hits[name] += 1
+        return shared_key, value
+
+    def _shared_store(self, name, shared_key, user_id, value):
+        try:
+            data = dumps(value)
+        except Exception as e:
+            print(f"⚠️ {name} result cannot be shared: {str(e)}")
+            return
+        if len(data) <= self.shared.max_entry_bytes:
+            self._shared_call(self.shared.set, shared_key, user_id, data)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, _, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def _store(self, key, user_id, value, ttl):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        push_ttl = self.push_ttl
+        if ttl and push_ttl:
+            ttl = max(ttl, push_ttl)
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            # A write may have bumped the version while we were computing
+            if key[2] != self._versions.get(user_id, 0):
+                return
+
+            self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions[oldest_key[0]] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.current_bytes -= entry[1]
+        user_keys = self._user_keys.get(key[1])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._user_keys[key[1]]
+
+def cached_per_user(get_cache, ttl=None, shared=False):
+    """Decorator caching `func(user_id, *args, **kwargs)` in the cache returned by `get_cache`.
+
+    Cached values are shared between callers and must be treated as
+    read-only. With `shared`, results also go to the cross-replica tier, so
+    they must pickle. Error fallbacks should be returned via `fallback`.
+    """
+    def decorator(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(user_id, *args, **kwargs):
+            cache_args = args + tuple(sorted(kwargs.items()))
+
+            def compute():
+                # Label the queries this function runs in the query metrics
+                with query_label(name):
+                    return func(user_id, *args, **kwargs)
+
+            return get_cache().get_or_compute(name, user_id, cache_args, compute, ttl=ttl, shared=shared)
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
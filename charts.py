@@ -0,0 +1,143 @@
+"""Plotly figures for the Dashboard and Analytics pages.
+
+Figures are built from data that is already aggregated (the dashboard
+snapshot, `LedgerAnalytics`, the daily rollups) and the app caches them per
+user data version, so a rerun hands Streamlit a finished figure instead of
+running Plotly Express again. Line series longer than `MAX_CHART_POINTS`,
+such as the Analytics page's balance over a user's whole daily history, are
+reduced with largest-triangle-three-buckets (LTTB) before the figure is
+built, which keeps the payload sent to the browser bounded however much
+history a user has while preserving the peaks and troughs a plain stride
+would drop.
+
+Inputs carry amounts in paise; the figures plot rupees. Cached figures are
+shared between sessions and must not be modified.
+"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from money import to_rupees
+
+# Most points drawn per line trace
+MAX_CHART_POINTS = 500
+TRANSPARENT_LAYOUT = {
+    'height': 400,
+    'plot_bgcolor': 'rgba(0,0,0,0)',
+    'paper_bgcolor': 'rgba(0,0,0,0)'
+}
+TYPE_COLORS = {'Income': '#10b981', 'Expense': '#ef4444'}
+
+def lttb_indices(x, y, threshold):
+    """Indices of the `threshold` points LTTB keeps from the series (x, y).
+
+    `x` must be sorted ascending. The first and last points are always kept;
+    every bucket in between keeps the point forming the largest triangle
+    with the previously kept point and the mean of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # threshold - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, threshold - 1).astype('int64')
+    indices = np.empty(threshold, dtype='int64')
+    indices[0], indices[-1] = 0, n - 1
+
+    kept = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        mean_x = x[end:next_end].mean()
+        mean_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[kept] - mean_x) * (y[start:end] - y[kept])
+            - (x[kept] - x[start:end]) * (mean_y - y[kept])
+        )
+        kept = start + int(areas.argmax())
+        indices[bucket + 1] = kept
+    return indices
+
+def downsample(frame, x, y, max_points=MAX_CHART_POINTS, by=None):
+    """Rows of `frame` kept by LTTB on (x, y), per `by` group if given"""
+    if by is not None and (frame.empty or frame.groupby(by).size().max() <= max_points):
+        return frame
+    if by is None:
+        if len(frame) <= max_points:
+            return frame
+        x_values = frame[x].to_numpy()
+        if np.issubdtype(x_values.dtype, np.datetime64):
+            x_values = x_values.astype('datetime64[ns]').astype('int64')
+        elif x_values.dtype == object:
+            x_values = np.arange(len(frame))
+        return frame.iloc[lttb_indices(x_values, frame[y].to_numpy(), max_points)]
+
+    return pd.concat(
+        [downsample(group, x, y, max_points) for _, group in frame.groupby(by, sort=False)],
+        ignore_index=True
+    )
+
+def daily_balance_figure(daily_summary, max_points=MAX_CHART_POINTS,
+                         title='💹 Daily Balance Trend (Last 30 Days)'):
+    """Cumulative balance line from {'date', 'type', 'amount'} rows"""
+    df_daily = pd.DataFrame(daily_summary)
+    df_daily['amount'] = to_rupees(df_daily['amount'])
+    df_pivot = df_daily.pivot(index='date', columns='type', values='amount').fillna(0)
+    df_pivot['balance'] = df_pivot.get('Income', 0) - df_pivot.get('Expense', 0)
+    df_pivot['cumulative_balance'] = df_pivot['balance'].cumsum()
+
+    trend = downsample(
+        df_pivot['cumulative_balance'].rename_axis('date').reset_index(),
+        'date', 'cumulative_balance', max_points
+    )
+    fig = px.line(
+        x=trend['date'],
+        y=trend['cumulative_balance'],
+        title=title,
+        labels={'x': 'Date', 'y': 'Balance (₹)'}
+    )
+    fig.update_layout(showlegend=False, **TRANSPARENT_LAYOUT)
+    fig.update_traces(line_color='#667eea', line_width=3)
+    return fig
+
+def income_expense_figure(income, expense):
+    """Income vs expenses pie"""
+    fig = px.pie(
+        values=[to_rupees(income), to_rupees(expense)],
+        names=['Income', 'Expenses'],
+        title='📊 Income vs Expenses',
+        color_discrete_map={'Income': '#10b981', 'Expenses': '#ef4444'}
+    )
+    fig.update_layout(**TRANSPARENT_LAYOUT)
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
+def monthly_trend_figure(monthly, max_points=MAX_CHART_POINTS):
+    """Income and expense lines from (month, type, amount) rows"""
+    monthly = downsample(monthly, 'month', 'amount', max_points, by='type')
+    monthly = monthly.assign(amount=to_rupees(monthly['amount']))
+    fig = px.line(
+        monthly,
+        x='month',
+        y='amount',
+        color='type',
+        title='Monthly Income vs Expenses Trend',
+        color_discrete_map=TYPE_COLORS,
+        labels={'amount': 'Amount (₹)', 'month': 'Month'}
+    )
+    fig.update_layout(**TRANSPARENT_LAYOUT)
+    return fig
+
+def category_figure(totals, title, colors):
+    """Pie of (category, amount) totals"""
+    fig = px.pie(
+        totals.assign(amount=to_rupees(totals['amount'])),
+        values='amount',
+        names='category',
+        title=title,
+        color_discrete_sequence=colors
+    )
+    fig.update_layout(**TRANSPARENT_LAYOUT)
+    return fig
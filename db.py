@@ -0,0 +1,153 @@
+import os
+import sqlite3
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, event, text
+
+from metrics import TimedQueuePool, instrument_engine
+
+# Default file of the embedded database
+DEFAULT_SQLITE_PATH = "budget_buddy.db"
+# Text form of TIMESTAMP values in the embedded database; fixed width, so
+# string comparison orders them correctly
+SQLITE_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+# Recognised values of boolean environment flags; anything else means the default
+TRUE_VALUES = ("1", "true", "yes", "on")
+FALSE_VALUES = ("0", "false", "no", "off")
+
+def env_int(name, default):
+    """Integer environment variable, falling back to `default` when unset or invalid"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def env_float(name, default):
+    """Float environment variable, falling back to `default` when unset or invalid"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def env_flag(name, default=False):
+    """Boolean environment variable: 1/true/yes/on or 0/false/no/off, else `default`"""
+    value = os.environ.get(name, "").strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    return default
+
+def get_storage_backend():
+    """Storage backend from STORAGE_BACKEND: PostgreSQL when DATABASE_URL is set, else embedded SQLite"""
+    backend = os.environ.get("STORAGE_BACKEND", "").lower()
+    if backend in ("postgresql", "postgres"):
+        return "postgresql"
+    if backend == "sqlite":
+        return "sqlite"
+    return "postgresql" if os.environ.get("DATABASE_URL") else "sqlite"
+
+def get_database_url():
+    """Database URL for the configured backend, making sure SSL is requested for PostgreSQL"""
+    if get_storage_backend() == "sqlite":
+        return f"sqlite:///{os.environ.get('SQLITE_PATH', DEFAULT_SQLITE_PATH)}"
+
+    database_url = os.environ.get("DATABASE_URL")
+
+    if not database_url:
+        return None
+
+    return require_ssl(database_url)
+
+def require_ssl(database_url):
+    """PostgreSQL URL with sslmode=require unless it sets an sslmode already"""
+    if "sslmode=" not in database_url:
+        database_url += ("&" if "?" in database_url else "?") + "sslmode=require"
+    return database_url
+
+def register_sqlite_types():
+    """Store datetimes as fixed-width text and read TIMESTAMP/DATE columns back as Python objects"""
+    sqlite3.register_adapter(datetime, lambda value: value.strftime(SQLITE_TIMESTAMP_FORMAT))
+    sqlite3.register_adapter(date, lambda value: value.isoformat())
+    sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+    sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+def create_sqlite_engine(database_url):
+    """Engine for the embedded database: WAL mode, shared across Streamlit threads"""
+    register_sqlite_types()
+    engine = create_engine(
+        database_url,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": 30,
+            "detect_types": sqlite3.PARSE_DECLTYPES
+        },
+        poolclass=TimedQueuePool,
+        pool_size=3,
+        max_overflow=5,
+        pool_timeout=30,
+        echo=False
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Readers never block the writer and vice versa
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+
+    return engine
+
+def create_postgres_engine(database_url, connect_timeout=30):
+    """Pooled PostgreSQL engine with query metrics; connects lazily"""
+    engine = create_engine(
+        database_url,
+        connect_args={
+            "connect_timeout": connect_timeout,
+            "application_name": "budget_buddy_railway"
+        },
+        poolclass=TimedQueuePool,
+        pool_size=3,
+        max_overflow=5,
+        pool_timeout=30,
+        pool_recycle=3600,
+        pool_pre_ping=True,
+        echo=False
+    )
+    return instrument_engine(engine)
+
+def create_database_engine(database_url=None):
+    """Create and test a pooled engine for the configured database.
+
+    Shared by the Streamlit app and the command-line tools. Returns None when
+    no URL is configured or the connection test fails.
+    """
+    try:
+        database_url = database_url or get_database_url()
+
+        if not database_url:
+            print("❌ DATABASE_URL not found!")
+            return None
+
+        if database_url.startswith("sqlite"):
+            print(f"🗄️ Opening embedded database {database_url[len('sqlite:///'):]}...")
+            engine = instrument_engine(create_sqlite_engine(database_url))
+        else:
+            print(f"🔗 Connecting to database...")
+            engine = create_postgres_engine(database_url)
+
+        # Test the connection
+        with engine.connect() as conn:
+            result = conn.execute(text("SELECT 1 as test"))
+            test_result = result.fetchone()
+            if test_result and test_result[0] == 1:
+                print("✅ Database connection successful!")
+                return engine
+            else:
+                raise Exception("Connection test failed")
+
+    except Exception as e:
+        print(f"❌ Database connection error: {str(e)}")
+        return None
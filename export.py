@@ -0,0 +1,108 @@
+"""On-demand export of a user's transactions as CSV, Parquet or Arrow IPC.
+
+Exports are written batch by batch from a server-side cursor into a spooled
+temporary file, so the full history is never materialised as one pandas
+frame or CSV string. Parquet and Arrow are zstd-compressed and need pyarrow
+(installed with Streamlit).
+
+Streamlit's download button keeps its data in memory, so serving the
+finished file still reads it whole (`read_download`). Files over
+MAX_DOWNLOAD_BYTES are refused rather than held in server memory.
+"""
+import io
+import tempfile
+
+from ledger import ledger_chunk
+from money import to_rupees
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - pyarrow ships with streamlit
+    pa = None
+
+# Exports larger than this spill from memory to a temporary file on disk
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+# Largest export handed to the download button (100 MiB)
+MAX_DOWNLOAD_BYTES = 100 * 1024 * 1024
+
+# label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+def available_export_formats():
+    """Export formats supported by the installed libraries"""
+    if pa is None:
+        return ["CSV"]
+    return list(EXPORT_FORMATS)
+
+def arrow_schema():
+    return pa.schema([
+        ('id', pa.int64()),
+        ('type', pa.string()),
+        ('category', pa.string()),
+        ('amount', pa.float64()),
+        ('description', pa.string()),
+        ('created_at', pa.timestamp('us')),
+    ])
+
+def export_chunk(batch):
+    """Ledger chunk with amounts in rupees, as exports (and the importer) expect"""
+    chunk = ledger_chunk(batch)
+    chunk['amount'] = to_rupees(chunk['amount'])
+    return chunk
+
+def write_csv(row_batches, out):
+    header = True
+    for batch in row_batches:
+        chunk = export_chunk(batch)
+        out.write(chunk.to_csv(index=False, header=header).encode("utf-8"))
+        header = False
+    if header:
+        out.write(export_chunk([]).to_csv(index=False).encode("utf-8"))
+
+def write_parquet(row_batches, out):
+    schema = arrow_schema()
+    with pa.parquet.ParquetWriter(out, schema, compression="zstd") as writer:
+        for batch in row_batches:
+            writer.write_table(pa.Table.from_pandas(export_chunk(batch), schema=schema, preserve_index=False))
+
+def write_arrow(row_batches, out):
+    schema = arrow_schema()
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_file(out, schema, options=options) as writer:
+        for batch in row_batches:
+            writer.write_table(pa.Table.from_pandas(export_chunk(batch), schema=schema, preserve_index=False))
+
+EXPORT_WRITERS = {
+    "CSV": write_csv,
+    "Parquet": write_parquet,
+    "Arrow": write_arrow,
+}
+
+def export_transactions(row_batches, export_format):
+    """Write the streamed rows in `export_format` and return the file, rewound for reading"""
+    if export_format not in available_export_formats():
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    EXPORT_WRITERS[export_format](row_batches, out)
+    out.seek(0)
+    return out
+
+def read_download(export_file):
+    """Contents of a finished export for the download button, refusing very large ones"""
+    export_file.seek(0, io.SEEK_END)
+    size = export_file.tell()
+    if size > MAX_DOWNLOAD_BYTES:
+        raise ValueError(
+            f"export is {size / 1024 / 1024:.0f} MiB, over the "
+            f"{MAX_DOWNLOAD_BYTES // (1024 * 1024)} MiB download limit; "
+            f"Parquet and Arrow exports are compressed and much smaller"
+        )
+    export_file.seek(0)
+    return export_file.read()
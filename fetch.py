@@ -0,0 +1,50 @@
+"""Concurrent fetching of a page's independent data.
+
+`fetch_all(executor, *calls)` runs zero-argument callables at the same time
+and returns their results in order: the first in the calling thread, the
+rest on a process-wide thread pool, each on a pooled connection of its own.
+A cold page then waits for its slowest query instead of the sum of them.
+
+The pool is shared by every session, so FETCH_WORKERS bounds how many
+connections concurrent fetches hold across the whole process. The default
+matches the engine's persistent pool size (see db.py); the overflow
+connections stay free for the sessions' own queries and writes.
+
+Workers run with the calling session's Streamlit context, so the data
+functions' `st.error` messages still reach the page. A call must not fetch
+concurrently itself; nested calls run one after another.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from db import env_int
+
+# Default worker threads; the engines keep 3 persistent connections
+DEFAULT_FETCH_WORKERS = 3
+WORKER_PREFIX = "fetch"
+
+def get_fetch_workers():
+    """FETCH_WORKERS, falling back to the default"""
+    return max(env_int("FETCH_WORKERS", DEFAULT_FETCH_WORKERS), 1)
+
+def create_fetch_executor(workers=None):
+    """Thread pool for `fetch_all`, one per process"""
+    return ThreadPoolExecutor(max_workers=workers or get_fetch_workers(), thread_name_prefix=WORKER_PREFIX)
+
+def fetch_all(executor, *calls):
+    """Results of `calls`, in order, run concurrently"""
+    if len(calls) < 2 or threading.current_thread().name.startswith(WORKER_PREFIX):
+        # A worker waiting on the pool it runs in could deadlock it
+        return [call() for call in calls]
+
+    ctx = get_script_run_ctx()
+
+    def run(call):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return call()
+
+    futures = [executor.submit(run, call) for call in calls[1:]]
+    first = calls[0]()
+    return [first] + [future.result() for future in futures]
@@ -0,0 +1,362 @@
+"""Bulk import of bank statements (CSV, OFX/QFX, QIF) into `transactions`.
+
+Files are parsed into pandas batches and validated with vectorised column
+operations. Valid rows are streamed into a temporary staging table (with
+`COPY ... FROM STDIN` on PostgreSQL) and merged into `transactions` in one
+statement that skips rows already imported (matched on a per-user content
+hash) and updates `daily_rollups` in the same transaction.
+"""
+import io
+import re
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from money import MAX_AMOUNT_PAISE, to_paise_series
+from partitions import ensure_partitions
+from rollups import rollup_add_cte
+from storage import get_backend
+
+# Rows parsed, validated and copied per batch
+IMPORT_BATCH_SIZE = 50_000
+DEFAULT_CATEGORY = "Other"
+# Date formats tried in order after ISO 8601; Indian banks write the day first
+DAY_FIRST_FORMATS = ['%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y', '%d-%b-%Y', '%d %b %Y', '%d-%b-%y']
+
+STAGING_COLUMNS = ['user_id', 'type', 'category', 'amount', 'description', 'created_at', 'import_hash']
+
+# Accepted header names (lower case) for each field of a CSV statement
+CSV_COLUMN_ALIASES = {
+    'date': ['created_at', 'date', 'transaction date', 'txn date', 'value date', 'posted date'],
+    'amount': ['amount', 'amount (inr)', 'value', 'transaction amount'],
+    'debit': ['debit', 'withdrawal', 'withdrawal amt.', 'debit amount'],
+    'credit': ['credit', 'deposit', 'deposit amt.', 'credit amount'],
+    'type': ['type', 'transaction type', 'dr/cr'],
+    'category': ['category'],
+    'description': ['description', 'narration', 'details', 'memo', 'payee', 'particulars', 'remarks'],
+}
+
+@dataclass
+class ImportResult:
+    """Outcome of one import run"""
+    parsed: int = 0
+    rejected: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    seconds: float = 0.0
+    # A few (row number, reason) examples of rejected rows
+    rejection_samples: list = field(default_factory=list)
+
+    @property
+    def rows_per_second(self):
+        return self.parsed / self.seconds if self.seconds > 0 else 0.0
+
+def detect_format(filename):
+    """Statement format from the file extension"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension in ('ofx', 'qfx'):
+        return 'ofx'
+    if extension == 'qif':
+        return 'qif'
+    return 'csv'
+
+def read_csv_batches(data, batch_size=IMPORT_BATCH_SIZE):
+    """Yield raw statement batches (date, amount, type, category, description) from CSV bytes"""
+    reader = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False,
+                         chunksize=batch_size, skipinitialspace=True)
+    for chunk in reader:
+        chunk.columns = [str(c).strip().lower() for c in chunk.columns]
+        columns = {}
+        for name, aliases in CSV_COLUMN_ALIASES.items():
+            match = next((a for a in aliases if a in chunk.columns), None)
+            columns[name] = chunk[match] if match else None
+
+        if columns['date'] is None or (columns['amount'] is None and columns['debit'] is None
+                                       and columns['credit'] is None):
+            raise ValueError("CSV needs a date column and an amount (or debit/credit) column")
+
+        amount = columns['amount']
+        if amount is None:
+            # Separate debit/credit columns: debits become negative amounts
+            debit = parse_amounts(columns['debit']) if columns['debit'] is not None else 0
+            credit = parse_amounts(columns['credit']) if columns['credit'] is not None else 0
+            amount = pd.Series(np.nan_to_num(credit) - np.nan_to_num(debit), index=chunk.index)
+
+        yield pd.DataFrame({
+            'date': columns['date'],
+            'amount': amount,
+            'type': columns['type'],
+            'category': columns['category'],
+            'description': columns['description'],
+        })
+
+OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)(?:</STMTTRN>|(?=<STMTTRN>)|(?=</BANKTRANLIST>))', re.S | re.I)
+OFX_FIELD = re.compile(r'<(TRNTYPE|DTPOSTED|TRNAMT|NAME|MEMO)>([^<\r\n]*)', re.I)
+
+def read_ofx_batches(data, batch_size=IMPORT_BATCH_SIZE):
+    """Yield raw statement batches from OFX/QFX (SGML or XML) bytes"""
+    text_data = data.decode('utf-8', errors='replace')
+    records = []
+    for block in OFX_TRANSACTION.findall(text_data):
+        fields = {k.upper(): v.strip() for k, v in OFX_FIELD.findall(block)}
+        records.append((
+            fields.get('DTPOSTED', '')[:8],
+            fields.get('TRNAMT', ''),
+            fields.get('NAME') or fields.get('MEMO', '')
+        ))
+
+    for start in range(0, len(records), batch_size):
+        frame = pd.DataFrame(records[start:start + batch_size], columns=['date', 'amount', 'description'])
+        frame['type'] = None
+        frame['category'] = None
+        yield frame
+
+def read_qif_batches(data, batch_size=IMPORT_BATCH_SIZE):
+    """Yield raw statement batches from QIF bytes"""
+    text_data = data.decode('utf-8', errors='replace')
+    records = []
+    current = {}
+    for line in text_data.splitlines():
+        if not line or line.startswith('!'):
+            continue
+        code, value = line[0], line[1:].strip()
+        if code == '^':
+            if current:
+                records.append((
+                    current.get('D', '').replace("'", '/'),
+                    current.get('T') or current.get('U', ''),
+                    current.get('L'),
+                    current.get('P') or current.get('M', '')
+                ))
+            current = {}
+        elif code in 'DTUPML':
+            current[code] = value
+
+    for start in range(0, len(records), batch_size):
+        frame = pd.DataFrame(records[start:start + batch_size],
+                             columns=['date', 'amount', 'category', 'description'])
+        frame['type'] = None
+        yield frame
+
+def estimate_row_count(data, statement_format):
+    """Cheap upper bound on the number of records, for progress reporting"""
+    if statement_format == 'ofx':
+        return data.upper().count(b'<STMTTRN>')
+    if statement_format == 'qif':
+        return data.count(b'^')
+    return max(data.count(b'\n') - 1, 1)
+
+READERS = {
+    'csv': read_csv_batches,
+    'ofx': read_ofx_batches,
+    'qif': read_qif_batches,
+}
+
+def parse_amounts(values):
+    """Vectorised amount parsing: strips currency symbols and thousands separators"""
+    amounts = pd.to_numeric(values, errors='coerce')
+    unparsed = amounts.isna() & values.notna() & (values != '')
+    if not unparsed.any():
+        return amounts
+    # Thousands separators are by far the most common decoration
+    amounts[unparsed] = pd.to_numeric(values[unparsed].astype(str).str.replace(',', '', regex=False),
+                                      errors='coerce')
+    unparsed = amounts.isna() & values.notna() & (values != '')
+    if not unparsed.any():
+        return amounts
+    # Only the values that are not plain numbers go through the string cleanup
+    cleaned = values[unparsed].astype(str).str.replace(r'[₹$,\s]|Rs\.?|INR', '', regex=True)
+    # Bank-style "(123.45)" means a negative amount
+    cleaned = cleaned.str.replace(r'^\((.*)\)$', r'-\1', regex=True)
+    amounts[unparsed] = pd.to_numeric(cleaned, errors='coerce')
+    return amounts
+
+def parse_dates(values):
+    """Vectorised date parsing for the formats banks commonly export"""
+    values = values.astype(str).str.strip()
+    # Fast path for ISO dates (our own CSV export) and OFX YYYYMMDD dates
+    dates = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    compact = values.str.fullmatch(r'\d{8}')
+    if compact.any():
+        dates = dates.where(~compact, pd.to_datetime(values.where(compact), format='%Y%m%d', errors='coerce'))
+    # Common day-first statement formats, each parsed in one vectorised pass
+    for date_format in DAY_FIRST_FORMATS:
+        unparsed = dates.isna() & (values != '')
+        if not unparsed.any():
+            return dates
+        dates = dates.where(~unparsed, pd.to_datetime(values.where(unparsed), format=date_format, errors='coerce'))
+    # Anything else is parsed per value, day first as Indian statements are
+    unparsed = dates.isna() & (values != '')
+    if unparsed.any():
+        dates = dates.where(~unparsed, pd.to_datetime(values.where(unparsed), errors='coerce',
+                                                      format='mixed', dayfirst=True))
+    return dates
+
+def validate_batch(raw, user_id, row_offset=0):
+    """Validate one raw batch; returns (valid staging frame, list of (row number, reason))"""
+    signed_amount = parse_amounts(raw['amount'])
+    created_at = parse_dates(raw['date'])
+
+    type_text = raw['type'].fillna('').astype(str).str.strip().str.lower()
+    is_income = type_text.isin(['income', 'credit', 'cr', 'deposit'])
+    is_expense = type_text.isin(['expense', 'debit', 'dr', 'withdrawal'])
+    # Without an explicit type, the sign decides: money in is income
+    is_income = is_income | (~is_expense & (signed_amount > 0))
+
+    # Whole paise; NaN marks amounts that did not parse
+    paise = to_paise_series(signed_amount.abs())
+
+    reasons = pd.Series(None, index=raw.index, dtype=object)
+    reasons = reasons.mask(paise > MAX_AMOUNT_PAISE, "amount too large")
+    reasons = reasons.mask(paise == 0, "zero amount")
+    reasons = reasons.mask(paise.isna(), "invalid amount")
+    reasons = reasons.mask(created_at.isna(), "invalid date")
+    valid = reasons.isna()
+
+    category = raw['category'].fillna('').astype(str).str.strip().str.slice(0, 255)
+    description = raw['description']
+
+    staged = pd.DataFrame({
+        'user_id': user_id,
+        'type': np.where(is_income, 'Income', 'Expense'),
+        'category': category.where(category != '', DEFAULT_CATEGORY),
+        # Invalid rows (NaN or out-of-range amounts among them) are dropped below
+        'amount': paise.where(valid, 0).astype('int64'),
+        'description': description.fillna('').astype(str).str.strip(),
+        'created_at': created_at,
+    })[valid.to_numpy()]
+
+    # 1-based record numbers within the file
+    invalid_positions = np.flatnonzero(~valid.to_numpy())
+    rejected = [(row_offset + int(pos) + 1, reasons.iloc[pos]) for pos in invalid_positions]
+    return staged, rejected
+
+def add_import_hashes(staged, seen_counts):
+    """Add the dedupe hash column to a validated batch.
+
+    The hash covers the row content plus its occurrence number among identical
+    rows of the same file, so re-importing a file skips every row while
+    genuinely repeated lines (two identical purchases on one day) are kept.
+    `seen_counts` carries occurrence counts across batches.
+    """
+    # Amounts are hashed as rupees, as they were before amounts moved to
+    # paise, so files imported earlier are still recognised
+    content = pd.util.hash_pandas_object(
+        staged[['type', 'category', 'amount', 'description', 'created_at']].assign(
+            amount=staged['amount'] / 100
+        ),
+        index=False
+    )
+    offset = content.map(seen_counts).fillna(0).astype('int64')
+    occurrence = staged.groupby(content.to_numpy()).cumcount().to_numpy() + offset.to_numpy()
+
+    for value, count in content.value_counts().items():
+        seen_counts[value] = seen_counts.get(value, 0) + count
+
+    combined = pd.util.hash_pandas_object(
+        pd.DataFrame({'content': content.to_numpy(), 'occurrence': occurrence}), index=False
+    )
+    staged = staged.copy()
+    # BIGINT column: reinterpret the unsigned 64-bit hash as signed
+    staged['import_hash'] = combined.to_numpy().view('int64')
+    return staged
+
+MERGE_STAGING = f"""
+    WITH inserted AS (
+        INSERT INTO transactions (user_id, type, category, amount, description, created_at, import_hash)
+        SELECT user_id, type, category, amount, description, created_at, import_hash
+        FROM import_staging
+        ON CONFLICT (user_id, import_hash, created_at) WHERE import_hash IS NOT NULL DO NOTHING
+        RETURNING user_id, created_at, type, category, amount
+    ),
+    {rollup_add_cte('inserted')}
+    SELECT COUNT(*) FROM inserted
+"""
+
+# SQLite: triggers update the rollups; `WHERE true` keeps ON CONFLICT from parsing as a join
+SQLITE_MERGE_STAGING = """
+    INSERT INTO transactions (user_id, type, category, amount, description, created_at, import_hash)
+    SELECT user_id, type, category, amount, description, created_at, import_hash
+    FROM import_staging
+    WHERE true
+    ON CONFLICT (user_id, import_hash) WHERE import_hash IS NOT NULL DO NOTHING
+"""
+
+CREATE_STAGING_TABLE = """
+    CREATE TEMP TABLE import_staging (
+        user_id VARCHAR(255) NOT NULL,
+        type VARCHAR(50) NOT NULL,
+        category VARCHAR(255) NOT NULL,
+        amount BIGINT NOT NULL,
+        description TEXT,
+        created_at TIMESTAMP NOT NULL,
+        import_hash BIGINT NOT NULL
+    )
+"""
+
+def import_statement(engine, user_id, data, filename, progress=None, batch_size=IMPORT_BATCH_SIZE):
+    """Import a statement file for one user and return an ImportResult.
+
+    `progress(rows_parsed, total_rows, rows_per_second)` is called after every
+    batch, with total_rows an estimate from the raw file. The
+    whole import is one database transaction: it either lands completely or
+    not at all.
+    """
+    result = ImportResult()
+    started = time.perf_counter()
+    statement_format = detect_format(filename)
+    total_rows = estimate_row_count(data, statement_format)
+    batches = READERS[statement_format](data, batch_size)
+    seen_counts = {}
+
+    backend = get_backend(engine)
+    raw_connection = engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        if backend.embedded:
+            # SQLite has no ON COMMIT DROP; clear any leftover of a failed import
+            cursor.execute("DROP TABLE IF EXISTS temp.import_staging")
+            cursor.execute(CREATE_STAGING_TABLE)
+        else:
+            cursor.execute(CREATE_STAGING_TABLE + " ON COMMIT DROP")
+
+        for raw in batches:
+            staged, rejected = validate_batch(raw, user_id, row_offset=result.parsed)
+            result.parsed += len(raw)
+            result.rejected += len(rejected)
+            result.rejection_samples.extend(rejected[:10 - len(result.rejection_samples)])
+
+            if not staged.empty:
+                backend.bulk_insert(cursor, 'import_staging', STAGING_COLUMNS,
+                                    add_import_hashes(staged, seen_counts))
+
+            if progress is not None:
+                elapsed = time.perf_counter() - started
+                progress(result.parsed, total_rows, result.parsed / elapsed if elapsed > 0 else 0.0)
+
+        if backend.embedded:
+            cursor.execute(SQLITE_MERGE_STAGING)
+            result.inserted = cursor.rowcount
+            cursor.execute("DROP TABLE temp.import_staging")
+        else:
+            # Statements can reach back years; create those months' partitions
+            # in their own short transaction so the merge doesn't hold the
+            # partition lock on `transactions`
+            cursor.execute("SELECT DISTINCT date_trunc('month', created_at) FROM import_staging")
+            months = [row[0] for row in cursor.fetchall()]
+            with engine.begin() as conn:
+                ensure_partitions(conn, months)
+            cursor.execute(MERGE_STAGING)
+            result.inserted = cursor.fetchone()[0]
+        result.duplicates = result.parsed - result.rejected - result.inserted
+        raw_connection.commit()
+    except Exception:
+        raw_connection.rollback()
+        raise
+    finally:
+        raw_connection.close()
+
+    result.seconds = time.perf_counter() - started
+    return result
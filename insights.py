@@ -0,0 +1,113 @@
+"""Spending insights from the dashboard snapshot.
+
+Every metric the Insights page reports (month-over-month change, top
+category share, savings rate) is derived from one `DashboardSnapshot`, whose
+totals and category sums come from a single read of `daily_rollups`, so
+their cost does not depend on the number of transactions. `insight_metrics`
+collects the numbers and `build_insights` turns them into the alert cards;
+the app caches the result per user data version.
+"""
+from dataclasses import dataclass
+
+# Month-over-month spending change (%) that triggers an alert or a compliment
+SPENDING_CHANGE_THRESHOLD = 20
+# Share of expenses (%) above which the top category gets a budgeting tip
+TOP_CATEGORY_SHARE_THRESHOLD = 40
+# Savings rate (%) bands
+GOOD_SAVINGS_RATE = 20
+LOW_SAVINGS_RATE = 10
+
+@dataclass(frozen=True)
+class InsightMetrics:
+    """The numbers behind a user's insights"""
+    # Amounts in paise
+    income: int = 0
+    expense: int = 0
+    current_month_expense: int = 0
+    last_month_expense: int = 0
+    top_category: str = None
+    top_category_amount: int = 0
+    has_categories: bool = False
+
+    @property
+    def month_over_month_change(self):
+        """Percent change of this month's expenses over last month's, None without a baseline"""
+        if self.last_month_expense <= 0:
+            return None
+        return (self.current_month_expense - self.last_month_expense) / self.last_month_expense * 100
+
+    @property
+    def top_category_share(self):
+        """Percent of all expenses spent in the top category, None without expenses"""
+        if self.top_category is None or self.expense <= 0:
+            return None
+        return self.top_category_amount / self.expense * 100
+
+    @property
+    def savings_rate(self):
+        """Percent of income not spent, None without income"""
+        if self.income <= 0:
+            return None
+        return (self.income - self.expense) / self.income * 100
+
+def insight_metrics(snapshot):
+    """InsightMetrics of a DashboardSnapshot"""
+    # category_summary is sorted largest first, so the first expense row is the top one
+    top = next(((category, amount) for category, type_, amount in snapshot.category_summary
+                if type_ == 'Expense'), (None, 0))
+    return InsightMetrics(
+        income=snapshot.income,
+        expense=snapshot.expense,
+        current_month_expense=snapshot.current_month_expense,
+        last_month_expense=snapshot.last_month_expense,
+        top_category=top[0],
+        top_category_amount=top[1],
+        has_categories=bool(snapshot.category_summary)
+    )
+
+def build_insights(metrics):
+    """Alert, success and tip cards for an InsightMetrics"""
+    if not metrics.has_categories:
+        return []
+
+    insights = []
+
+    change = metrics.month_over_month_change
+    if change is not None:
+        if change > SPENDING_CHANGE_THRESHOLD:
+            insights.append({
+                'type': 'alert',
+                'title': '🚨 High Spending Alert!',
+                'message': f'Your spending increased by {change:.1f}% this month compared to last month.'
+            })
+        elif change < -SPENDING_CHANGE_THRESHOLD:
+            insights.append({
+                'type': 'success',
+                'title': '🎉 Great Savings!',
+                'message': f'You reduced spending by {abs(change):.1f}% this month. Keep it up!'
+            })
+
+    share = metrics.top_category_share
+    if share is not None and share > TOP_CATEGORY_SHARE_THRESHOLD:
+        insights.append({
+            'type': 'insight',
+            'title': f'💡 Top Spending: {metrics.top_category}',
+            'message': f'{share:.1f}% of your expenses go to {metrics.top_category}. Consider budgeting for this category.'
+        })
+
+    savings_rate = metrics.savings_rate
+    if savings_rate is not None:
+        if savings_rate > GOOD_SAVINGS_RATE:
+            insights.append({
+                'type': 'success',
+                'title': '💰 Excellent Savings Rate!',
+                'message': f'You\'re saving {savings_rate:.1f}% of your income. Financial experts recommend 20%+.'
+            })
+        elif savings_rate < LOW_SAVINGS_RATE:
+            insights.append({
+                'type': 'alert',
+                'title': '⚠️ Low Savings Rate',
+                'message': f'Your savings rate is {savings_rate:.1f}%. Try to aim for at least 20% of your income.'
+            })
+
+    return insights
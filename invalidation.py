@@ -0,0 +1,183 @@
+"""Push-based cache invalidation with PostgreSQL LISTEN/NOTIFY.
+
+Migration 8 adds statement-level triggers on `transactions` and
+`daily_rollups` that send `NOTIFY budget_changes, '<user_id>'` once per
+changed user when the writing transaction commits, whichever process or tool
+made the change. Every app process runs one `ChangeListener` thread on its own
+connection that bumps exactly those users' data versions in its `DataCache`,
+so a write on one replica is visible on every other replica at once. Writers
+in the app replace the shared tier's versions themselves; the one listener
+holding an advisory lock does it for every notification too, so writes made
+by maintenance scripts or manual SQL reach the shared tier as well.
+
+While the listener is connected, cached entries can live for
+CACHE_PUSH_TTL seconds instead of the short safety-net TTL; when it loses its
+connection the cache is cleared and falls back to the short TTL until the
+listener is back. The embedded SQLite backend runs in a single process whose
+writes invalidate the cache directly, so it has no listener.
+
+Set CACHE_LISTEN=0 when the database is only reachable through a pooler that
+does not support LISTEN (PgBouncer in transaction pooling mode).
+"""
+import select
+import threading
+import time
+
+from sqlalchemy import text
+
+from db import env_flag, env_int
+
+NOTIFY_CHANNEL = "budget_changes"
+# TTL of cached entries while change notifications are being received (10 minutes)
+DEFAULT_PUSH_TTL = 600
+# Seconds between reconnect attempts after the listener lost its connection
+RECONNECT_INTERVAL = 5
+# Longest the listener waits for a notification before checking for close()
+POLL_INTERVAL = 1.0
+# An idle connection is checked this often (seconds), so a dead one is noticed
+HEALTH_CHECK_INTERVAL = 30
+# Session advisory lock held by the one listener that invalidates the shared tier
+SHARED_INVALIDATION_LOCK_ID = 720_412_002
+
+# One notification per distinct user per statement; PostgreSQL folds identical
+# notifications within a transaction, so an import sends each user's id once
+CREATE_NOTIFY_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION notify_budget_changes()
+    RETURNS TRIGGER
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        PERFORM pg_notify('{NOTIFY_CHANNEL}', user_id)
+        FROM (SELECT DISTINCT user_id FROM changed_rows) changed_users;
+        RETURN NULL;
+    END
+    $$
+"""
+
+def create_notify_triggers(conn, table):
+    """Notify on every insert, update and delete of `table`"""
+    # Transition tables allow only one event per trigger
+    for event, transition in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        name = f"trg_{table}_notify_{event.lower()}"
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {name} ON {table}"))
+        conn.execute(text(f"""
+            CREATE TRIGGER {name}
+            AFTER {event} ON {table}
+            REFERENCING {transition} TABLE AS changed_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_budget_changes()
+        """))
+
+def notify_triggers_installed(conn):
+    """Whether migration 8's triggers exist, so listening will see every change"""
+    return conn.execute(text("""
+        SELECT COUNT(*) = 6 FROM pg_trigger
+        WHERE tgname IN (
+            'trg_transactions_notify_insert', 'trg_transactions_notify_update',
+            'trg_transactions_notify_delete', 'trg_daily_rollups_notify_insert',
+            'trg_daily_rollups_notify_update', 'trg_daily_rollups_notify_delete'
+        ) AND tgparentid = 0
+    """)).scalar()
+
+def listen_enabled():
+    """Whether CACHE_LISTEN allows a change listener (default on)"""
+    return env_flag("CACHE_LISTEN", default=True)
+
+def get_push_ttl():
+    """CACHE_PUSH_TTL, falling back to the default"""
+    return env_int("CACHE_PUSH_TTL", DEFAULT_PUSH_TTL)
+
+class ChangeListener:
+    """Background thread that LISTENs for budget_changes and invalidates the data cache"""
+
+    def __init__(self, engine, cache, push_ttl=None, on_change=None):
+        self.engine = engine
+        self.cache = cache
+        # Called with each batch of changed user_ids before their versions are bumped
+        self.on_change = on_change
+        self.push_ttl = push_ttl if push_ttl is not None else get_push_ttl()
+        self.notifications = 0
+        self.reconnects = 0
+        self.connected = False
+        # Whether this listener holds SHARED_INVALIDATION_LOCK_ID
+        self.leader = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="change-listener", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout=5):
+        self._stopped.set()
+        self._thread.join(timeout)
+
+    def _connect(self):
+        # A connection of its own: detached from the pool, so it keeps no pool slot
+        fairy = self.engine.raw_connection()
+        fairy.detach()
+        dbapi_connection = fairy.dbapi_connection
+        dbapi_connection.autocommit = True
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        return dbapi_connection
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                connection = self._connect()
+            except Exception as e:
+                print(f"⚠️ Cache change listener could not connect: {str(e)}")
+                self._stopped.wait(RECONNECT_INTERVAL)
+                continue
+
+            # Changes made while disconnected were missed; start from an empty cache
+            self.cache.clear()
+            self.cache.push_ttl = self.push_ttl
+            self.connected = True
+            try:
+                self._listen(connection)
+            except Exception as e:
+                print(f"⚠️ Cache change listener lost its connection: {str(e)}")
+                self.reconnects += 1
+            finally:
+                self.connected = False
+                self.leader = False
+                self.cache.push_ttl = None
+                self.cache.clear()
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            self._stopped.wait(RECONNECT_INTERVAL)
+
+    def _try_lead(self, connection):
+        """Take the shared invalidation lock if no other listener holds it"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (SHARED_INVALIDATION_LOCK_ID,))
+            self.leader = cursor.fetchone()[0]
+        if self.leader:
+            print("✅ Cache change listener invalidating the shared cache tier")
+
+    def _listen(self, connection):
+        if self.cache.shared is not None:
+            self._try_lead(connection)
+        checked_at = time.monotonic()
+        while not self._stopped.is_set():
+            if select.select([connection], [], [], POLL_INTERVAL) == ([], [], []):
+                if time.monotonic() - checked_at >= HEALTH_CHECK_INTERVAL:
+                    if self.cache.shared is not None and not self.leader:
+                        # Doubles as the health check; takes over if the leader went away
+                        self._try_lead(connection)
+                    else:
+                        with connection.cursor() as cursor:
+                            cursor.execute("SELECT 1")
+                    checked_at = time.monotonic()
+                continue
+            checked_at = time.monotonic()
+            connection.poll()
+            user_ids = {notify.payload for notify in connection.notifies}
+            connection.notifies.clear()
+            if user_ids:
+                self.notifications += len(user_ids)
+                if self.on_change is not None:
+                    self.on_change(user_ids)
+                # The writer has replaced the shared versions of its own writes; one
+                # listener does it for all, which covers writes made outside the app
+                self.cache.bump_versions(user_ids, shared=self.leader)
@@ -0,0 +1,83 @@
+"""Typed, columnar frame of a user's transaction history.
+
+`build_ledger_frame` turns streamed row batches into one DataFrame with
+compact dtypes (categorical type/category, datetime64[ns] timestamps,
+int64 amounts in paise). The app caches one `LedgerFrame` per user data version and
+hands every page the same instance; derived columns are computed on first use.
+"""
+from functools import cached_property
+
+import pandas as pd
+
+LEDGER_COLUMNS = ['id', 'type', 'category', 'amount', 'description', 'created_at']
+
+def empty_ledger_dataframe():
+    """Zero-row frame with the ledger dtypes"""
+    return pd.DataFrame({
+        'id': pd.Series(dtype='int64'),
+        'type': pd.Series(dtype='category'),
+        'category': pd.Series(dtype='category'),
+        'amount': pd.Series(dtype='int64'),
+        'description': pd.Series(dtype='object'),
+        'created_at': pd.Series(dtype='datetime64[ns]')
+    })
+
+def ledger_chunk(batch):
+    """Typed DataFrame for one batch of (id, type, category, amount, description, created_at) rows"""
+    chunk = pd.DataFrame.from_records(batch, columns=LEDGER_COLUMNS)
+    chunk['id'] = chunk['id'].astype('int64')
+    chunk['amount'] = chunk['amount'].astype('int64')
+    chunk['created_at'] = pd.to_datetime(chunk['created_at'])
+    return chunk
+
+def build_ledger_frame(row_batches):
+    """Build a LedgerFrame from batches of transaction rows"""
+    chunks = [ledger_chunk(batch) for batch in row_batches]
+
+    if not chunks:
+        return LedgerFrame(empty_ledger_dataframe())
+
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    df['type'] = df['type'].astype('category')
+    df['category'] = df['category'].astype('category')
+    return LedgerFrame(df)
+
+class LedgerFrame:
+    """Shared, read-only view of one user's transactions, newest first.
+
+    Pages must not modify `df`; with pandas copy-on-write enabled any
+    accidental modification copies instead of changing the cached frame.
+    """
+
+    def __init__(self, df):
+        self._df = df
+
+    @property
+    def df(self):
+        return self._df
+
+    @property
+    def empty(self):
+        return self._df.empty
+
+    def __len__(self):
+        return len(self._df)
+
+    @cached_property
+    def month(self):
+        """First day of each transaction's month (datetime64), aligned with df"""
+        months = self._df['created_at'].to_numpy().astype('datetime64[M]')
+        return pd.Series(months.astype('datetime64[ns]'), index=self._df.index, name='month')
+
+    @cached_property
+    def date(self):
+        """Midnight of each transaction's day (datetime64), aligned with df"""
+        return self._df['created_at'].dt.normalize().rename('date')
+
+    def memory_usage(self, deep=True):
+        """Bytes held by the frame and any derived columns computed so far"""
+        total = int(self._df.memory_usage(deep=deep).sum())
+        for derived in ('month', 'date'):
+            if derived in self.__dict__:
+                total += int(self.__dict__[derived].memory_usage(deep=deep))
+        return total
@@ -0,0 +1,310 @@
+"""Query, pool and cache metrics for the data layer.
+
+`instrument_engine` hooks SQLAlchemy cursor events to record per-query
+latency histograms, rows returned and errors; `TimedQueuePool` records how
+long callers wait to check out a pooled connection. Queries are labelled with
+the data function that ran them (see `query_label`) and a short fingerprint of
+the statement text. Everything is exposed in Prometheus text format, either
+from `start_metrics_server` or `render_prometheus`.
+"""
+import contextlib
+import contextvars
+import hashlib
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_PREVIEW_CHARS = 160
+
+_current_function = contextvars.ContextVar("current_function", default="other")
+
+@contextlib.contextmanager
+def query_label(name):
+    """Attribute the queries run inside this block to the data function `name`"""
+    token = _current_function.set(name)
+    try:
+        yield
+    finally:
+        _current_function.reset(token)
+
+def normalize_statement(statement):
+    """Statement text with whitespace collapsed"""
+    return re.sub(r"\s+", " ", statement).strip()
+
+def statement_fingerprint(statement):
+    """Short stable id of a statement's text"""
+    return hashlib.md5(normalize_statement(statement).encode()).hexdigest()[:8]
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs ending with +Inf"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        lower = 0.0
+        previous = 0
+        for bound, cumulative in self.cumulative():
+            if cumulative >= rank:
+                if bound == float('inf'):
+                    return lower
+                in_bucket = cumulative - previous
+                return lower + (bound - lower) * ((rank - previous) / in_bucket if in_bucket else 0)
+            lower, previous = bound, cumulative
+        return lower
+
+class QueryStats:
+    """Latency, rows and errors of one (function, statement) pair"""
+
+    def __init__(self, function, fingerprint, preview):
+        self.function = function
+        self.fingerprint = fingerprint
+        self.preview = preview
+        self.latency = Histogram()
+        self.rows = 0
+        self.errors = 0
+        self.max_seconds = 0.0
+
+class Metrics:
+    """Process-wide registry of data-layer metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = {}
+        self.pool_wait = Histogram()
+        # statement text -> (fingerprint, preview), so each statement is hashed once
+        self._fingerprints = {}
+
+    def _stats(self, statement):
+        entry = self._fingerprints.get(statement)
+        if entry is None:
+            entry = (statement_fingerprint(statement),
+                     normalize_statement(statement)[:STATEMENT_PREVIEW_CHARS])
+            self._fingerprints[statement] = entry
+        fingerprint, preview = entry
+        function = _current_function.get()
+        key = (function, fingerprint)
+        stats = self.queries.get(key)
+        if stats is None:
+            stats = self.queries[key] = QueryStats(function, fingerprint, preview)
+        return stats
+
+    def observe_query(self, statement, seconds, rows):
+        with self._lock:
+            stats = self._stats(statement)
+            stats.latency.observe(seconds)
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            if rows is not None and rows >= 0:
+                stats.rows += rows
+
+    def observe_error(self, statement):
+        with self._lock:
+            self._stats(statement).errors += 1
+
+    def observe_pool_wait(self, seconds):
+        with self._lock:
+            self.pool_wait.observe(seconds)
+
+    def query_summary(self):
+        """One dict per (function, statement), slowest total time first"""
+        with self._lock:
+            rows = [
+                {
+                    'function': s.function,
+                    'query': s.fingerprint,
+                    'calls': s.latency.count,
+                    'total_ms': s.latency.sum * 1000,
+                    'p50_ms': s.latency.quantile(0.5) * 1000,
+                    'p95_ms': s.latency.quantile(0.95) * 1000,
+                    'max_ms': s.max_seconds * 1000,
+                    'rows': s.rows,
+                    'errors': s.errors,
+                    'statement': s.preview
+                }
+                for s in self.queries.values()
+            ]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self.queries.clear()
+            self.pool_wait = Histogram()
+
+METRICS = Metrics()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            METRICS.observe_pool_wait(time.perf_counter() - started)
+
+def instrument_engine(engine, metrics=METRICS):
+    """Record latency, rows and errors of every statement run on `engine`"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        metrics.observe_query(statement, time.perf_counter() - started, cursor.rowcount)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+        if context.statement:
+            metrics.observe_error(context.statement)
+
+    return engine
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", " ")
+
+def format_bound(bound):
+    return "+Inf" if bound == float('inf') else repr(bound)
+
+def render_histogram(lines, name, histogram, labels=""):
+    separator = "," if labels else ""
+    for bound, count in histogram.cumulative():
+        lines.append(f'{name}_bucket{{{labels}{separator}le="{format_bound(bound)}"}} {count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {histogram.sum}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+
+def render_prometheus(metrics=METRICS, cache_stats=None, engine=None, replica_stats=None):
+    """All metrics in the Prometheus text exposition format"""
+    lines = [
+        "# HELP budget_buddy_query_duration_seconds Statement latency by data function and statement",
+        "# TYPE budget_buddy_query_duration_seconds histogram",
+    ]
+    with metrics._lock:
+        queries = list(metrics.queries.values())
+        for stats in queries:
+            labels = f'function="{escape_label(stats.function)}",query="{stats.fingerprint}"'
+            render_histogram(lines, "budget_buddy_query_duration_seconds", stats.latency, labels)
+
+        lines.append("# HELP budget_buddy_query_rows_total Rows returned or affected")
+        lines.append("# TYPE budget_buddy_query_rows_total counter")
+        for stats in queries:
+            lines.append(f'budget_buddy_query_rows_total{{function="{escape_label(stats.function)}",'
+                         f'query="{stats.fingerprint}"}} {stats.rows}')
+
+        lines.append("# HELP budget_buddy_query_errors_total Statements that raised")
+        lines.append("# TYPE budget_buddy_query_errors_total counter")
+        for stats in queries:
+            lines.append(f'budget_buddy_query_errors_total{{function="{escape_label(stats.function)}",'
+                         f'query="{stats.fingerprint}"}} {stats.errors}')
+
+        lines.append("# HELP budget_buddy_pool_checkout_wait_seconds Time spent waiting for a pooled connection")
+        lines.append("# TYPE budget_buddy_pool_checkout_wait_seconds histogram")
+        render_histogram(lines, "budget_buddy_pool_checkout_wait_seconds", metrics.pool_wait)
+
+    if engine is not None:
+        lines.append("# HELP budget_buddy_pool_checked_out Connections currently checked out")
+        lines.append("# TYPE budget_buddy_pool_checked_out gauge")
+        lines.append(f"budget_buddy_pool_checked_out {engine.pool.checkedout()}")
+
+    if cache_stats is not None:
+        for counter in ('hits', 'misses', 'evictions'):
+            lines.append(f"# HELP budget_buddy_cache_{counter}_total Data cache {counter} per function")
+            lines.append(f"# TYPE budget_buddy_cache_{counter}_total counter")
+            for function, counts in cache_stats['functions'].items():
+                lines.append(f'budget_buddy_cache_{counter}_total{{function="{escape_label(function)}"}} '
+                             f'{counts[counter]}')
+        lines.append("# HELP budget_buddy_cache_bytes Estimated size of the data cache")
+        lines.append("# TYPE budget_buddy_cache_bytes gauge")
+        lines.append(f"budget_buddy_cache_bytes {cache_stats['bytes']}")
+        lines.append("# HELP budget_buddy_cache_entries Entries in the data cache")
+        lines.append("# TYPE budget_buddy_cache_entries gauge")
+        lines.append(f"budget_buddy_cache_entries {cache_stats['entries']}")
+
+    if cache_stats is not None and 'shared' in cache_stats:
+        for counter in ('hits', 'misses'):
+            lines.append(f"# HELP budget_buddy_shared_cache_{counter}_total Shared cache {counter} per function")
+            lines.append(f"# TYPE budget_buddy_shared_cache_{counter}_total counter")
+            for function, counts in cache_stats['functions'].items():
+                lines.append(f'budget_buddy_shared_cache_{counter}_total{{function="{escape_label(function)}"}} '
+                             f'{counts["shared_" + counter]}')
+        lines.append("# HELP budget_buddy_shared_cache_errors_total Failed shared cache calls")
+        lines.append("# TYPE budget_buddy_shared_cache_errors_total counter")
+        lines.append(f"budget_buddy_shared_cache_errors_total {cache_stats['shared']['errors']}")
+
+    if replica_stats is not None:
+        lines.append("# HELP budget_buddy_reads_total Reads routed to the primary or a replica")
+        lines.append("# TYPE budget_buddy_reads_total counter")
+        lines.append(f'budget_buddy_reads_total{{target="primary"}} {replica_stats["primary_reads"]}')
+        for replica in replica_stats['replicas']:
+            lines.append(f'budget_buddy_reads_total{{target="{escape_label(replica["name"])}"}} {replica["reads"]}')
+        lines.append("# HELP budget_buddy_replica_lag_seconds Replay lag at the last check (+Inf when unreachable)")
+        lines.append("# TYPE budget_buddy_replica_lag_seconds gauge")
+        for replica in replica_stats['replicas']:
+            if replica['lag'] is not None:
+                lines.append(f'budget_buddy_replica_lag_seconds{{replica="{escape_label(replica["name"])}"}} '
+                             f'{format_bound(replica["lag"])}')
+        lines.append("# HELP budget_buddy_replica_healthy Whether a replica is serving reads")
+        lines.append("# TYPE budget_buddy_replica_healthy gauge")
+        for replica in replica_stats['replicas']:
+            lines.append(f'budget_buddy_replica_healthy{{replica="{escape_label(replica["name"])}"}} '
+                         f'{int(replica["healthy"])}')
+
+    return "\n".join(lines) + "\n"
+
+def start_metrics_server(port, render):
+    """Serve `render()` at http://0.0.0.0:<port>/metrics from a daemon thread"""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📈 Metrics available on port {port} at /metrics")
+    return server
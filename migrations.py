@@ -0,0 +1,388 @@
+"""Versioned schema migrations.
+
+Migrations run once per process at server start (`migrate` is called from
+the app behind `st.cache_resource`) or from the command line, never per
+session. Applied versions are recorded in `schema_version`; a PostgreSQL
+advisory lock keeps replicas that start together from migrating at once.
+
+Migrations are written to be safe on databases created before this table
+existed (`IF NOT EXISTS` everywhere) and apply to both storage backends.
+Index builds on `transactions` use `CREATE INDEX CONCURRENTLY` on PostgreSQL
+so they do not block writes; those migrations are marked non-transactional.
+Migration 5 rewrites `transactions` as a partitioned table (see partitions.py)
+in one transaction that locks the table while the rows are copied.
+Migration 7 converts amounts from DECIMAL rupees to BIGINT paise (see
+money.py); the earlier migrations create the DECIMAL columns it converts.
+Migration 8 adds the change notification triggers (see invalidation.py).
+
+    python migrations.py status
+    python migrations.py migrate [--target VERSION]
+"""
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from db import create_database_engine
+from invalidation import CREATE_NOTIFY_FUNCTION, create_notify_triggers
+from partitions import (
+    CREATE_ENSURE_PARTITIONS_FUNCTION,
+    list_partitions,
+    maintain_partitions,
+    partitioning_enabled,
+)
+from rollups import CREATE_ROLLUPS_TABLE, SQLITE_ROLLUP_TRIGGERS, rebuild_rollups
+from search import SEARCH_DOCUMENT
+from storage import get_backend
+
+# Arbitrary constant identifying the migration advisory lock
+MIGRATION_LOCK_ID = 720_412_001
+# Seconds between attempts to take the lock while another process migrates
+MIGRATION_LOCK_POLL_INTERVAL = 1
+
+CREATE_SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    # Called with a connection; inside a transaction unless transactional=False
+    apply: object
+    transactional: bool = True
+
+def index_validity(conn, name):
+    """True/False for a valid/invalid index, None if it does not exist"""
+    return conn.execute(text("""
+        SELECT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name
+    """), {'name': name}).scalar()
+
+def create_index_concurrently(conn, name, unique, definition):
+    """CREATE INDEX CONCURRENTLY, replacing an invalid leftover of a failed build"""
+    if index_validity(conn, name) is False:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    conn.execute(text(f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}"))
+
+def create_partitioned_index(conn, name, unique, definition):
+    """Index a partitioned `transactions` without blocking writes.
+
+    PostgreSQL cannot build an index on a partitioned table CONCURRENTLY, so
+    the parent index is created ON ONLY the parent (invalid, and copied to
+    partitions created later), each partition is indexed CONCURRENTLY and
+    attached, and the parent index becomes valid with the last attach. A
+    failed run picks up where it stopped.
+    """
+    if index_validity(conn, name):
+        return
+    conn.execute(text(f"CREATE {unique}INDEX IF NOT EXISTS {name} {definition.replace('ON ', 'ON ONLY ', 1)}"))
+
+    attached = {row[0] for row in conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_index x ON x.indexrelid = i.inhrelid
+        JOIN pg_class c ON c.oid = x.indrelid
+        WHERE i.inhparent = to_regclass(:name)
+    """), {'name': name})}
+    suffix = name.removeprefix("idx_transactions_")
+    for partition, _, _ in list_partitions(conn):
+        if partition in attached:
+            continue
+        child = f"{partition}_{suffix}"
+        create_index_concurrently(conn, child, unique, definition.replace("ON transactions", f"ON {partition}", 1))
+        conn.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {child}"))
+
+def create_index(conn, name, definition):
+    """Create an index, CONCURRENTLY on PostgreSQL.
+
+    `definition` is everything after the index name, e.g. "ON t (a, b)",
+    optionally prefixed with "UNIQUE ". On PostgreSQL this must run outside a
+    transaction, and an invalid leftover of a failed build is replaced.
+    """
+    unique = "UNIQUE " if definition.startswith("UNIQUE ") else ""
+    definition = definition[len(unique):]
+
+    if conn.dialect.name == "sqlite":
+        conn.execute(text(f"CREATE {unique}INDEX IF NOT EXISTS {name} {definition}"))
+    elif definition.startswith("ON transactions") and partitioning_enabled(conn):
+        create_partitioned_index(conn, name, unique, definition)
+    else:
+        create_index_concurrently(conn, name, unique, definition)
+
+def create_transactions_table(conn):
+    if conn.dialect.name == "sqlite":
+        # Same columns; timestamps are stored as fixed-width local-time text
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id VARCHAR(255) NOT NULL,
+                type VARCHAR(50) NOT NULL,
+                category VARCHAR(255) NOT NULL,
+                amount DECIMAL(10,2) NOT NULL,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f000', 'now', 'localtime'))
+            )
+        """))
+    else:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS transactions (
+                id SERIAL PRIMARY KEY,
+                user_id VARCHAR(255) NOT NULL,
+                type VARCHAR(50) NOT NULL,
+                category VARCHAR(255) NOT NULL,
+                amount DECIMAL(10,2) NOT NULL,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_transactions_user_id ON transactions(user_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(created_at)"))
+
+def add_read_path_indexes(conn):
+    # Keyset pagination: newest-first pages per user
+    create_index(conn, "idx_transactions_user_created_id",
+                 "ON transactions(user_id, created_at DESC, id DESC)")
+    # Transactions page filters
+    create_index(conn, "idx_transactions_user_type_category",
+                 "ON transactions(user_id, type, category)")
+    create_index(conn, "idx_transactions_user_category",
+                 "ON transactions(user_id, category)")
+
+def add_import_hash(conn):
+    # Content hash of bulk-imported rows, unique per user for dedupe
+    if conn.dialect.name == "sqlite":
+        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(transactions)"))}
+        if 'import_hash' not in columns:
+            conn.execute(text("ALTER TABLE transactions ADD COLUMN import_hash BIGINT"))
+    else:
+        conn.execute(text("ALTER TABLE transactions ADD COLUMN IF NOT EXISTS import_hash BIGINT"))
+    create_index(conn, "idx_transactions_user_import_hash",
+                 "UNIQUE ON transactions(user_id, import_hash) WHERE import_hash IS NOT NULL")
+
+def create_daily_rollups(conn):
+    # Backfill only when the table is new
+    rollups_exist = get_backend(conn).table_exists(conn, 'daily_rollups')
+    conn.execute(text(CREATE_ROLLUPS_TABLE))
+    if conn.dialect.name == "sqlite":
+        for trigger in SQLITE_ROLLUP_TRIGGERS:
+            conn.execute(text(trigger))
+    if not rollups_exist:
+        rebuild_rollups(conn)
+
+def partition_transactions(conn):
+    # The embedded database is one file; there is nothing to partition
+    if conn.dialect.name == "sqlite":
+        return
+
+    conn.execute(text(CREATE_ENSURE_PARTITIONS_FUNCTION))
+    if partitioning_enabled(conn):
+        return
+
+    # Readers and writers wait for the whole swap; it runs once per database
+    conn.execute(text("LOCK TABLE transactions IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text("ALTER TABLE transactions RENAME TO transactions_unpartitioned"))
+    conn.execute(text("ALTER TABLE transactions_unpartitioned RENAME CONSTRAINT transactions_pkey TO transactions_unpartitioned_pkey"))
+    for index in ("idx_transactions_user_id", "idx_transactions_date", "idx_transactions_user_created_id",
+                  "idx_transactions_user_type_category", "idx_transactions_user_category",
+                  "idx_transactions_user_import_hash"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    # Keep the id sequence (and with it every existing id) for the new table
+    conn.execute(text("ALTER SEQUENCE transactions_id_seq OWNED BY NONE"))
+
+    # The partition key has to be part of the primary key and unique indexes
+    conn.execute(text("""
+        CREATE TABLE transactions (
+            id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
+            user_id VARCHAR(255) NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            category VARCHAR(255) NOT NULL,
+            amount DECIMAL(10,2) NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            import_hash BIGINT,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """))
+    conn.execute(text("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id"))
+
+    conn.execute(text("""
+        SELECT ensure_transaction_partitions(MIN(created_at), MAX(created_at))
+        FROM transactions_unpartitioned
+    """))
+    maintain_partitions(conn)
+    conn.execute(text("""
+        INSERT INTO transactions (id, user_id, type, category, amount, description, created_at, import_hash)
+        SELECT id, user_id, type, category, amount, description, created_at, import_hash
+        FROM transactions_unpartitioned
+    """))
+    conn.execute(text("DROP TABLE transactions_unpartitioned"))
+
+    # Built once on the parent, these cascade to every current and future
+    # partition. Partition pruning replaces the plain created_at index, and
+    # (user_id, created_at, id) covers lookups by user_id alone.
+    conn.execute(text("""
+        CREATE INDEX idx_transactions_user_created_id
+        ON transactions(user_id, created_at DESC, id DESC)
+    """))
+    conn.execute(text("CREATE INDEX idx_transactions_user_type_category ON transactions(user_id, type, category)"))
+    conn.execute(text("CREATE INDEX idx_transactions_user_category ON transactions(user_id, category)"))
+    # The import hash covers created_at, so adding it to the key changes nothing for dedupe
+    conn.execute(text("""
+        CREATE UNIQUE INDEX idx_transactions_user_import_hash
+        ON transactions(user_id, import_hash, created_at) WHERE import_hash IS NOT NULL
+    """))
+    conn.execute(text("ANALYZE transactions"))
+
+def add_search_indexes(conn):
+    # SQLite searches with LIKE; it has no tsvector or trigram indexes
+    if conn.dialect.name == "sqlite":
+        return
+
+    create_index(conn, "idx_transactions_search", f"ON transactions USING GIN (({SEARCH_DOCUMENT}))")
+
+    trigram_available = conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')"
+    )).scalar()
+    if not trigram_available:
+        print("⚠️ pg_trgm is not available on this server; search will not match misspellings")
+        return
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    create_index(conn, "idx_transactions_description_trgm",
+                 "ON transactions USING GIN (description gin_trgm_ops)")
+    create_index(conn, "idx_transactions_category_trgm",
+                 "ON transactions USING GIN (category gin_trgm_ops)")
+
+def store_amounts_in_paise(conn):
+    if conn.dialect.name == "sqlite":
+        # Column types are only affinities in SQLite; the DECIMAL columns keep
+        # integers as exact 64-bit INTEGER values once converted
+        conn.execute(text("UPDATE transactions SET amount = CAST(ROUND(amount * 100) AS INTEGER)"))
+        conn.execute(text("UPDATE daily_rollups SET total = CAST(ROUND(total * 100) AS INTEGER)"))
+        return
+
+    # Rewrites the table (every partition) under an exclusive lock, like migration 5
+    conn.execute(text("ALTER TABLE transactions ALTER COLUMN amount TYPE BIGINT USING ROUND(amount * 100)::BIGINT"))
+    conn.execute(text("ALTER TABLE daily_rollups ALTER COLUMN total TYPE BIGINT USING ROUND(total * 100)::BIGINT"))
+    conn.execute(text("ANALYZE transactions"))
+
+def add_change_notifications(conn):
+    # The embedded SQLite backend has a single process and no listener
+    if conn.dialect.name == "sqlite":
+        return
+
+    conn.execute(text(CREATE_NOTIFY_FUNCTION))
+    # Triggers on the partitioned parent are cloned to every partition, present and future
+    create_notify_triggers(conn, "transactions")
+    create_notify_triggers(conn, "daily_rollups")
+
+MIGRATIONS = [
+    Migration(1, "create transactions table", create_transactions_table),
+    Migration(2, "read path indexes", add_read_path_indexes, transactional=False),
+    Migration(3, "import hash column and unique index", add_import_hash, transactional=False),
+    Migration(4, "daily rollups", create_daily_rollups),
+    Migration(5, "monthly partitions of transactions", partition_transactions),
+    Migration(6, "search indexes", add_search_indexes, transactional=False),
+    Migration(7, "amounts in paise", store_amounts_in_paise),
+    Migration(8, "change notification triggers", add_change_notifications),
+]
+
+def latest_version():
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+def applied_versions(conn):
+    """Set of versions recorded in schema_version (empty if the table is missing)"""
+    if not get_backend(conn).table_exists(conn, 'schema_version'):
+        return set()
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+
+def pending_migrations(conn, target=None):
+    """Migrations not applied yet, up to `target` (default: all), in order"""
+    applied = applied_versions(conn)
+    return [
+        m for m in MIGRATIONS
+        if m.version not in applied and (target is None or m.version <= target)
+    ]
+
+def record_version(conn, migration):
+    conn.execute(text("""
+        INSERT INTO schema_version (version, name) VALUES (:version, :name)
+        ON CONFLICT (version) DO NOTHING
+    """), {'version': migration.version, 'name': migration.name})
+
+def acquire_migration_lock(lock_conn):
+    """Take the migration advisory lock, polling while another process holds it.
+
+    A blocking pg_advisory_lock would wait inside a statement and hold a
+    snapshot, which CREATE INDEX CONCURRENTLY in the lock holder waits for;
+    PostgreSQL then aborts one of them as a deadlock. Between attempts this
+    connection is idle, outside any transaction.
+    """
+    waiting = False
+    while not lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {'id': MIGRATION_LOCK_ID}).scalar():
+        if not waiting:
+            print("⏳ Another process is migrating the schema; waiting...")
+            waiting = True
+        time.sleep(MIGRATION_LOCK_POLL_INTERVAL)
+
+def migrate(engine, target=None):
+    """Apply pending migrations in order and return the versions applied"""
+    applied = []
+    # The embedded database has a single server process, so no lock is needed
+    advisory_lock = engine.dialect.name == "postgresql"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        if advisory_lock:
+            acquire_migration_lock(lock_conn)
+        try:
+            lock_conn.execute(text(CREATE_SCHEMA_VERSION_TABLE))
+            # Re-read under the lock: another replica may have just migrated
+            for migration in pending_migrations(lock_conn, target):
+                print(f"🔄 Applying migration {migration.version}: {migration.name}")
+                if migration.transactional:
+                    with engine.begin() as conn:
+                        migration.apply(conn)
+                        record_version(conn, migration)
+                else:
+                    migration.apply(lock_conn)
+                    record_version(lock_conn, migration)
+                applied.append(migration.version)
+        finally:
+            if advisory_lock:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {'id': MIGRATION_LOCK_ID})
+    return applied
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply or inspect schema migrations")
+    parser.add_argument("command", choices=["status", "migrate"])
+    parser.add_argument("--target", type=int, help="Stop after this version")
+    args = parser.parse_args(argv)
+
+    engine = create_database_engine()
+    if engine is None:
+        return 2
+
+    if args.command == "status":
+        with engine.connect() as conn:
+            applied = applied_versions(conn)
+        for m in MIGRATIONS:
+            marker = "✅" if m.version in applied else "⏳"
+            print(f"{marker} {m.version:>3} {m.name}")
+        return 0
+
+    applied = migrate(engine, args.target)
+    if applied:
+        print(f"✅ Applied migrations {', '.join(map(str, applied))}")
+    else:
+        print("✅ Schema is up to date")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
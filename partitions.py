@@ -0,0 +1,190 @@
+"""Monthly range partitions of `transactions` on PostgreSQL.
+
+Migration 5 turns `transactions` into a table partitioned by month on
+`created_at`, so queries with a date window only scan the matching partitions
+and vacuum and index builds work on one month at a time. Partitions are
+named `transactions_YYYY_MM` and are created by the
+`ensure_transaction_partitions(from, to)` SQL function, which does nothing
+when they exist already:
+
+- the app calls `maintain_partitions` at most once a day to keep
+  PARTITION_MONTHS_AHEAD months ready ahead of the current one;
+- bulk loads (statement imports, benchmark ledgers) call `ensure_partitions`
+  for the months they are about to insert, which may be far in the past.
+
+There is no default partition, so a row outside every partition fails loudly
+instead of landing in a catch-all that would block creating its month later.
+
+The embedded SQLite database is a single file and is not partitioned; every
+function here is a no-op there.
+
+    python partitions.py list
+    python partitions.py maintain [--months-ahead N]
+    python partitions.py detach 2022-01
+"""
+import argparse
+import sys
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from db import create_database_engine, env_int
+
+DEFAULT_MONTHS_AHEAD = 3
+# Arbitrary constant identifying the partition-creation advisory lock
+PARTITION_LOCK_ID = 720_412_002
+
+# Creating a partition locks the parent table, so the lock is only taken for
+# months that are actually missing; callers that find everything in place
+# (the common case) only pay for the to_regclass lookups.
+CREATE_ENSURE_PARTITIONS_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION ensure_transaction_partitions(from_ts TIMESTAMP, to_ts TIMESTAMP)
+    RETURNS INTEGER
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        month_start DATE := date_trunc('month', from_ts)::date;
+        partition_name TEXT;
+        created INTEGER := 0;
+    BEGIN
+        IF from_ts IS NULL OR to_ts IS NULL THEN
+            RETURN 0;
+        END IF;
+        WHILE month_start <= to_ts LOOP
+            partition_name := 'transactions_' || to_char(month_start, 'YYYY_MM');
+            IF to_regclass(partition_name) IS NULL THEN
+                PERFORM pg_advisory_xact_lock({PARTITION_LOCK_ID});
+                IF to_regclass(partition_name) IS NULL THEN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF transactions FOR VALUES FROM (%L) TO (%L)',
+                        partition_name, month_start, (month_start + INTERVAL '1 month')::date
+                    );
+                    created := created + 1;
+                END IF;
+            END IF;
+            month_start := (month_start + INTERVAL '1 month')::date;
+        END LOOP;
+        RETURN created;
+    END
+    $$
+"""
+
+def partitioning_enabled(conn):
+    """Whether `transactions` is a partitioned table on this connection's database"""
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table
+            WHERE partrelid = to_regclass('transactions')
+        )
+    """)).scalar())
+
+def get_months_ahead():
+    """PARTITION_MONTHS_AHEAD, falling back to the default"""
+    return max(env_int("PARTITION_MONTHS_AHEAD", DEFAULT_MONTHS_AHEAD), 0)
+
+def ensure_partitions(conn, timestamps):
+    """Create the partitions of the months the given timestamps fall in; returns how many were created.
+
+    Only months that occur get a partition, so one stray old date in an
+    import does not create every month since.
+    """
+    months = sorted({datetime(ts.year, ts.month, 1) for ts in timestamps})
+    if not months or not partitioning_enabled(conn):
+        return 0
+    return conn.execute(text("""
+        SELECT COALESCE(SUM(ensure_transaction_partitions(month, month)), 0)
+        FROM unnest(CAST(:months AS TIMESTAMP[])) AS month
+    """), {'months': months}).scalar()
+
+def maintain_partitions(conn, months_ahead=None):
+    """Create the partitions for this month and the next `months_ahead` months"""
+    if not partitioning_enabled(conn):
+        return 0
+    months_ahead = get_months_ahead() if months_ahead is None else months_ahead
+    return conn.execute(text(f"""
+        SELECT ensure_transaction_partitions(
+            LOCALTIMESTAMP,
+            date_trunc('month', LOCALTIMESTAMP) + INTERVAL '{int(months_ahead)} months'
+        )
+    """)).scalar()
+
+def list_partitions(conn):
+    """(name, lower bound, rows estimate) of every attached partition, oldest first"""
+    if not partitioning_enabled(conn):
+        return []
+    result = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'transactions'::regclass
+        ORDER BY c.relname
+    """))
+    return [(row[0], row[1], max(row[2], 0)) for row in result]
+
+def detach_partition(conn, month):
+    """Detach one month's partition for archiving and drop its rollups.
+
+    The partition is renamed to `transactions_YYYY_MM_archived` and stays in
+    the database as an ordinary table that can be dumped and dropped. Its
+    rows leave the app together with their rollups, so totals stay consistent
+    with `transactions`. Returns the archived table's name.
+    """
+    month_start = date(month.year, month.month, 1)
+    name = f"transactions_{month_start:%Y_%m}"
+    archived = f"{name}_archived"
+
+    exists = conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_inherits
+            WHERE inhparent = 'transactions'::regclass AND inhrelid = to_regclass(:name)
+        )
+    """), {'name': name}).scalar()
+    if not exists:
+        raise ValueError(f"{name} is not an attached partition of transactions")
+
+    conn.execute(text(f"ALTER TABLE transactions DETACH PARTITION {name}"))
+    conn.execute(text(f"ALTER TABLE {name} RENAME TO {archived}"))
+    conn.execute(text("""
+        DELETE FROM daily_rollups
+        WHERE day >= :month_start AND day < (CAST(:month_start AS DATE) + INTERVAL '1 month')
+    """), {'month_start': month_start})
+    return archived
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and maintain the monthly transactions partitions")
+    parser.add_argument("command", choices=["list", "maintain", "detach"])
+    parser.add_argument("month", nargs="?", help="With detach: the month to archive, as YYYY-MM")
+    parser.add_argument("--months-ahead", type=int, help="With maintain: months to create ahead")
+    args = parser.parse_args(argv)
+
+    engine = create_database_engine()
+    if engine is None:
+        return 2
+
+    with engine.connect() as conn:
+        if not partitioning_enabled(conn):
+            print("ℹ️ transactions is not partitioned on this database")
+            return 0
+
+        if args.command == "list":
+            for name, bound, rows in list_partitions(conn):
+                print(f"{name:<28} {rows:>12} rows  {bound}")
+            return 0
+
+        if args.command == "maintain":
+            created = maintain_partitions(conn, args.months_ahead)
+            conn.commit()
+            print(f"✅ Created {created} partition(s)")
+            return 0
+
+        if not args.month:
+            parser.error("detach needs a month (YYYY-MM)")
+        archived = detach_partition(conn, date.fromisoformat(f"{args.month}-01"))
+        conn.commit()
+        print(f"✅ Detached {args.month} as {archived}")
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
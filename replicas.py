@@ -0,0 +1,212 @@
+"""Read/write splitting across PostgreSQL streaming replicas.
+
+With DATABASE_REPLICA_URL set to one or more comma-separated replica URLs,
+the app's read functions take their connection from `ReplicaRouter.connect`,
+which picks a healthy replica in turn; writes, migrations and the change
+listener keep using the primary engine.
+
+A monitor thread measures each replica's replay lag every
+REPLICA_CHECK_INTERVAL seconds: a replica that has replayed the primary's
+WAL up to the position read just before is caught up, otherwise its lag is
+the age of the last commit it replayed. A replica that is unreachable or more than
+REPLICA_MAX_LAG_SECONDS behind gets no reads until a later check finds it
+healthy again, and a replica that fails to connect falls back to the primary
+for that read. With no healthy replica every read goes to the primary.
+
+Read-your-writes: after a user writes, their reads go to the primary for
+`max_lag + REPLICA_CHECK_INTERVAL` seconds. A replica in use was at most
+`max_lag` behind at a check at most REPLICA_CHECK_INTERVAL ago, so once the
+window has passed it has replayed the write. Writes this process does not
+make itself are seen through the change listener's notifications.
+"""
+import itertools
+import os
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+
+from db import create_postgres_engine, env_float, require_ssl
+
+# Replicas further behind than this (seconds) get no reads
+DEFAULT_REPLICA_MAX_LAG = 5.0
+# Seconds between replica health and lag checks
+REPLICA_CHECK_INTERVAL = 5
+# A down replica should fail fast so the read can fall back to the primary
+REPLICA_CONNECT_TIMEOUT = 5
+# A replica just short of the primary's position is asked again after this long
+CATCH_UP_GRACE = 0.1
+
+PRIMARY_WAL_POSITION = "SELECT CAST(pg_current_wal_flush_lsn() AS TEXT)"
+# Whether the replica has replayed up to the primary's position, and the age
+# of the last commit it replayed (Infinity before it has replayed any)
+REPLICA_REPLAY_STATE = """
+    SELECT
+        NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= CAST(:primary_position AS pg_lsn),
+        COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float8, 'Infinity')
+"""
+
+def get_replica_urls():
+    """Replica URLs from the comma-separated DATABASE_REPLICA_URL"""
+    urls = os.environ.get("DATABASE_REPLICA_URL", "")
+    return [require_ssl(url.strip()) for url in urls.split(",") if url.strip()]
+
+def get_replica_max_lag():
+    """REPLICA_MAX_LAG_SECONDS, falling back to the default"""
+    return env_float("REPLICA_MAX_LAG_SECONDS", DEFAULT_REPLICA_MAX_LAG)
+
+def replica_name(url):
+    """host:port/database of a replica URL, without credentials"""
+    parsed = make_url(url)
+    host = parsed.host or parsed.query.get("host", "localhost")
+    port = parsed.port or parsed.query.get("port", 5432)
+    return f"{host}:{port}/{parsed.database}"
+
+class Replica:
+    """One replica engine and its last measured state"""
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = False
+        self.lag = None
+
+class ReplicaRouter:
+    """Routes reads to healthy replicas and recent writers' reads to the primary"""
+
+    def __init__(self, primary, replica_urls, max_lag=None):
+        self.primary = primary
+        self.max_lag = max_lag if max_lag is not None else get_replica_max_lag()
+        self.sticky_seconds = self.max_lag + REPLICA_CHECK_INTERVAL
+        self.replicas = [
+            self._add_replica(replica_name(url), create_postgres_engine(url, REPLICA_CONNECT_TIMEOUT))
+            for url in replica_urls
+        ]
+        # Reads served per target, "primary" or a replica name
+        self.reads = Counter()
+        self._lock = threading.Lock()
+        # user_id -> monotonic time of the user's last write
+        self._written_at = {}
+        self._turn = itertools.count()
+        self._stopped = threading.Event()
+
+        self.check_replicas()
+        self._monitor = threading.Thread(target=self._run, name="replica-monitor", daemon=True)
+        self._monitor.start()
+
+    def _add_replica(self, name, engine):
+        replica = Replica(name, engine)
+
+        @event.listens_for(engine, "handle_error")
+        def mark_down(context):
+            # A dropped or refused connection takes the replica out until the next check
+            if context.is_disconnect or context.connection is None:
+                replica.healthy = False
+
+        return replica
+
+    def note_write(self, user_id):
+        """Send `user_id`'s reads to the primary until replicas have caught up"""
+        with self._lock:
+            self._written_at[user_id] = time.monotonic()
+
+    def note_writes(self, user_ids):
+        now = time.monotonic()
+        with self._lock:
+            for user_id in user_ids:
+                self._written_at[user_id] = now
+
+    def choose_replica(self, user_id):
+        """Replica that should serve a read for `user_id`, or None for the primary"""
+        with self._lock:
+            written_at = self._written_at.get(user_id)
+        if written_at is not None and time.monotonic() - written_at < self.sticky_seconds:
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def connect(self, user_id):
+        """Connection for a read by `user_id`, from a replica when one can serve it"""
+        replica = self.choose_replica(user_id)
+        if replica is not None:
+            try:
+                conn = replica.engine.connect()
+                self.reads[replica.name] += 1
+                return conn
+            except Exception as e:
+                print(f"⚠️ Replica {replica.name} unavailable, reading from the primary: {str(e)}")
+                replica.healthy = False
+        self.reads["primary"] += 1
+        return self.primary.connect()
+
+    def measure_lag(self, replica, primary_position, sampled_at):
+        """Upper bound in seconds on how far `replica` is behind the primary"""
+        with replica.engine.connect() as conn:
+            for attempt in range(2):
+                caught_up, replay_age = conn.execute(
+                    text(REPLICA_REPLAY_STATE), {'primary_position': primary_position}
+                ).one()
+                if caught_up:
+                    # Everything committed before the primary was sampled is on the replica
+                    return time.monotonic() - sampled_at
+                if not attempt:
+                    # WAL flushed a moment before the sample may still be in flight
+                    time.sleep(CATCH_UP_GRACE)
+        return replay_age
+
+    def check_replicas(self):
+        """Measure every replica's lag and mark it healthy or not"""
+        try:
+            with self.primary.connect() as conn:
+                sampled_at = time.monotonic()
+                primary_position = conn.execute(text(PRIMARY_WAL_POSITION)).scalar()
+        except Exception as e:
+            print(f"⚠️ Could not read the primary's WAL position: {str(e)}")
+            return
+
+        for replica in self.replicas:
+            try:
+                lag = self.measure_lag(replica, primary_position, sampled_at)
+                healthy = lag <= self.max_lag
+                if healthy and not replica.healthy:
+                    print(f"✅ Replica {replica.name} serving reads (lag {lag:.1f}s)")
+                elif not healthy and replica.healthy:
+                    print(f"⚠️ Replica {replica.name} is {lag:.1f}s behind; reading from the primary")
+                replica.lag, replica.healthy = lag, healthy
+            except Exception as e:
+                if replica.healthy or replica.lag is None:
+                    print(f"⚠️ Replica {replica.name} unavailable: {str(e)}")
+                replica.lag, replica.healthy = float('inf'), False
+
+        # Forget writes whose read-your-writes window has passed
+        cutoff = time.monotonic() - self.sticky_seconds
+        with self._lock:
+            self._written_at = {
+                user_id: written_at for user_id, written_at in self._written_at.items()
+                if written_at >= cutoff
+            }
+
+    def stats(self):
+        """Per-replica health, lag and reads, plus reads served by the primary"""
+        return {
+            'primary_reads': self.reads["primary"],
+            'replicas': [
+                {'name': replica.name, 'healthy': replica.healthy, 'lag': replica.lag,
+                 'reads': self.reads[replica.name]}
+                for replica in self.replicas
+            ]
+        }
+
+    def close(self, timeout=5):
+        self._stopped.set()
+        self._monitor.join(timeout)
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+    def _run(self):
+        while not self._stopped.wait(REPLICA_CHECK_INTERVAL):
+            self.check_replicas()
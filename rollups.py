@@ -0,0 +1,216 @@
+"""Per-user daily rollups of the transactions table.
+
+`daily_rollups` holds one row per (user, day, type, category) with the sum (in
+paise) and count of the matching transactions. The write paths keep it current in the
+same statement as the change to `transactions` (through triggers on the
+embedded SQLite backend), so the summary reads touch O(days x categories)
+rows instead of the whole history.
+
+Run `python rollups.py verify` to compare the rollups against the raw table,
+and `python rollups.py rebuild` (or `verify --fix`) to recompute them.
+"""
+import argparse
+import sys
+
+from sqlalchemy import text
+
+from db import create_database_engine
+
+# As created by migration 4; migration 7 turns `total` into BIGINT paise
+CREATE_ROLLUPS_TABLE = """
+    CREATE TABLE IF NOT EXISTS daily_rollups (
+        user_id VARCHAR(255) NOT NULL,
+        day DATE NOT NULL,
+        type VARCHAR(50) NOT NULL,
+        category VARCHAR(255) NOT NULL,
+        total DECIMAL(14,2) NOT NULL DEFAULT 0,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day, type, category)
+    )
+"""
+
+def rollup_add_cte(source):
+    """CTE that adds the rows of `source` to the rollups.
+
+    `source` names an earlier CTE returning user_id, created_at, type,
+    category and amount, typically `INSERT ... RETURNING`.
+    """
+    return f"""
+        rollup_add AS (
+            INSERT INTO daily_rollups (user_id, day, type, category, total, count)
+            SELECT user_id, created_at::date, type, category, SUM(amount), COUNT(*)
+            FROM {source}
+            GROUP BY user_id, created_at::date, type, category
+            ON CONFLICT (user_id, day, type, category) DO UPDATE
+            SET total = daily_rollups.total + EXCLUDED.total,
+                count = daily_rollups.count + EXCLUDED.count
+        )
+    """
+
+def rollup_subtract_cte(source):
+    """CTE that subtracts the rows of `source` (typically `DELETE ... RETURNING`) from the rollups"""
+    return f"""
+        rollup_subtract AS (
+            UPDATE daily_rollups r
+            SET total = r.total - d.total,
+                count = r.count - d.count
+            FROM (
+                SELECT user_id, created_at::date AS day, type, category,
+                       SUM(amount) AS total, COUNT(*) AS count
+                FROM {source}
+                GROUP BY user_id, created_at::date, type, category
+            ) d
+            WHERE r.user_id = d.user_id AND r.day = d.day
+                AND r.type = d.type AND r.category = d.category
+        )
+    """
+
+# The embedded SQLite schema has no data-modifying CTEs; triggers keep its rollups current
+SQLITE_ROLLUP_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_insert
+    AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO daily_rollups (user_id, day, type, category, total, count)
+        VALUES (NEW.user_id, date(NEW.created_at), NEW.type, NEW.category, NEW.amount, 1)
+        ON CONFLICT (user_id, day, type, category) DO UPDATE
+        SET total = total + excluded.total,
+            count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_delete
+    AFTER DELETE ON transactions
+    BEGIN
+        UPDATE daily_rollups
+        SET total = total - OLD.amount,
+            count = count - 1
+        WHERE user_id = OLD.user_id AND day = date(OLD.created_at)
+            AND type = OLD.type AND category = OLD.category;
+    END
+    """
+]
+
+def day_of(conn, column="created_at"):
+    """SQL for the calendar day of a timestamp column in the connection's dialect"""
+    if conn.dialect.name == "sqlite":
+        return f"date({column})"
+    return f"{column}::date"
+
+def user_filter(user_id, column="user_id"):
+    """Optional per-user WHERE fragment and parameters"""
+    if user_id is None:
+        return "", {}
+    return f"WHERE {column} = :user_id", {'user_id': user_id}
+
+def rebuild_rollups(conn, user_id=None):
+    """Recompute the rollups from `transactions`, for one user or everyone.
+
+    Concurrent writers are blocked on the rollups table until the caller
+    commits, so no delta is lost or counted twice during the rebuild.
+    """
+    where, params = user_filter(user_id)
+    day = day_of(conn)
+
+    # SQLite serialises writers on the database file already
+    if conn.dialect.name != "sqlite":
+        conn.execute(text("LOCK TABLE daily_rollups IN SHARE ROW EXCLUSIVE MODE"))
+    conn.execute(text(f"DELETE FROM daily_rollups {where}"), params)
+    result = conn.execute(text(f"""
+        INSERT INTO daily_rollups (user_id, day, type, category, total, count)
+        SELECT user_id, {day}, type, category, SUM(amount), COUNT(*)
+        FROM transactions
+        {where}
+        GROUP BY user_id, {day}, type, category
+    """), params)
+    return result.rowcount
+
+def verify_rollups(conn, user_id=None):
+    """Compare the rollups with the raw table and return the rows that differ.
+
+    Each mismatch is a dict with the rollup key plus the expected (raw) and
+    actual (rollup) total and count.
+    """
+    where, params = user_filter(user_id)
+    rollup_where = "WHERE (count <> 0 OR total <> 0)" + (" AND user_id = :user_id" if user_id is not None else "")
+    day = day_of(conn)
+    distinct = "IS NOT" if conn.dialect.name == "sqlite" else "IS DISTINCT FROM"
+
+    result = conn.execute(text(f"""
+        WITH raw AS (
+            SELECT user_id, {day} AS day, type, category,
+                   SUM(amount) AS total, COUNT(*) AS count
+            FROM transactions
+            {where}
+            GROUP BY user_id, {day}, type, category
+        ),
+        rolled AS (
+            SELECT user_id, day, type, category, total, count
+            FROM daily_rollups
+            {rollup_where}
+        )
+        SELECT user_id, day, type, category,
+               raw.total, rolled.total, raw.count, rolled.count
+        FROM raw FULL OUTER JOIN rolled USING (user_id, day, type, category)
+        WHERE raw.total {distinct} rolled.total
+            OR raw.count {distinct} rolled.count
+        ORDER BY user_id, day
+    """), params)
+
+    return [
+        {
+            'user_id': row[0],
+            'day': row[1],
+            'type': row[2],
+            'category': row[3],
+            'expected_total': row[4],
+            'actual_total': row[5],
+            'expected_count': row[6],
+            'actual_count': row[7]
+        }
+        for row in result
+    ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild or verify the daily_rollups table")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    parser.add_argument("--user-id", help="Only process this user's rows")
+    parser.add_argument("--fix", action="store_true",
+                        help="With verify: rebuild the rollups of every user with a mismatch")
+    args = parser.parse_args(argv)
+
+    engine = create_database_engine()
+    if engine is None:
+        return 2
+
+    with engine.connect() as conn:
+        conn.execute(text(CREATE_ROLLUPS_TABLE))
+
+        if args.command == "rebuild":
+            rows = rebuild_rollups(conn, args.user_id)
+            conn.commit()
+            print(f"✅ Rebuilt {rows} rollup rows")
+            return 0
+
+        mismatches = verify_rollups(conn, args.user_id)
+        if not mismatches:
+            print("✅ Rollups match the transactions table")
+            return 0
+
+        for m in mismatches:
+            print(f"❌ {m['user_id']} {m['day']} {m['type']}/{m['category']}: "
+                  f"expected {m['expected_total']} paise ({m['expected_count']} rows), "
+                  f"found {m['actual_total']} paise ({m['actual_count']} rows)")
+
+        if not args.fix:
+            return 1
+
+        affected_users = sorted({m['user_id'] for m in mismatches})
+        for affected_user in affected_users:
+            rebuild_rollups(conn, affected_user)
+        conn.commit()
+        print(f"🔧 Rebuilt rollups for {len(affected_users)} user(s)")
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
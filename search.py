@@ -0,0 +1,79 @@
+"""Ranked search over transaction descriptions and categories.
+
+On PostgreSQL the search runs against indexes built by migration 6:
+
+- a GIN index on `SEARCH_DOCUMENT`, the `simple` (unstemmed) tsvector of
+  description and category, matched with prefix terms, so "swig" finds
+  "Swiggy order";
+- `pg_trgm` GIN indexes on description and category, matched with the
+  word-similarity operator `<%`, so misspellings ("groceris") still match.
+
+Results are ranked by text rank plus trigram word similarity. Trigram
+matching is used only where the `pg_trgm` extension is installed; without it
+the search is full-text only. The embedded SQLite backend has neither index
+type and falls back to unranked `LIKE` matching of every term.
+"""
+import re
+
+from sqlalchemy import text
+
+from statements import execute_statement
+
+# Must match the index expression exactly for the planner to use the index
+SEARCH_DOCUMENT = "to_tsvector('simple', COALESCE(description, '') || ' ' || category)"
+# Longer queries are cut to this many terms
+MAX_SEARCH_TERMS = 8
+
+SEARCH_COLUMNS = "id, type, category, amount, description, created_at"
+
+def search_terms(query):
+    """Lower-case word terms of a search query"""
+    return re.findall(r"\w+", query.lower())[:MAX_SEARCH_TERMS]
+
+def trigram_enabled(conn):
+    """Whether pg_trgm is installed, checked once per pooled connection"""
+    if conn.dialect.name != "postgresql":
+        return False
+    if 'pg_trgm' not in conn.info:
+        conn.info['pg_trgm'] = bool(conn.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+        )).scalar())
+    return conn.info['pg_trgm']
+
+def search_transactions(conn, query, where, params, limit, offset=0):
+    """Rows matching `query` among those selected by the `where` fragment, best first"""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    params = dict(params, limit=limit, offset=offset)
+
+    if conn.dialect.name == "sqlite":
+        conditions = []
+        for i, term in enumerate(terms):
+            # Terms are word characters only; `_` is the one LIKE wildcard among them
+            params[f'term_{i}'] = "%" + term.replace("_", "\\_") + "%"
+            conditions.append(f"(description LIKE :term_{i} ESCAPE '\\' OR category LIKE :term_{i} ESCAPE '\\')")
+        return execute_statement(conn, f"""
+            SELECT {SEARCH_COLUMNS}
+            FROM transactions
+            WHERE {where} AND {' AND '.join(conditions)}
+            ORDER BY created_at DESC, id DESC
+            LIMIT :limit OFFSET :offset
+        """, params).fetchall()
+
+    params['tsquery'] = " & ".join(f"{term}:*" for term in terms)
+    match = f"{SEARCH_DOCUMENT} @@ to_tsquery('simple', :tsquery)"
+    rank = f"ts_rank({SEARCH_DOCUMENT}, to_tsquery('simple', :tsquery))"
+    if trigram_enabled(conn):
+        params['query'] = " ".join(terms)
+        match = f"({match} OR :query <% description OR :query <% category)"
+        rank = (f"{rank} + word_similarity(:query, COALESCE(description, ''))"
+                f" + word_similarity(:query, category)")
+
+    return execute_statement(conn, f"""
+        SELECT {SEARCH_COLUMNS}
+        FROM transactions
+        WHERE {where} AND {match}
+        ORDER BY {rank} DESC, created_at DESC, id DESC
+        LIMIT :limit OFFSET :offset
+    """, params).fetchall()
@@ -0,0 +1,261 @@
+"""Shared cache tier for aggregate results, common to every replica.
+
+The in-process `DataCache` is private to one server process, so each replica
+behind the load balancer would run and cache the same aggregate queries. With
+SHARED_CACHE_URL set, functions cached with `shared=True` also look in a second
+tier that every replica reads and writes:
+
+    SHARED_CACHE_URL=sqlite:////data/budget_buddy_cache.db   # replicas on one host or volume
+    SHARED_CACHE_URL=redis://:password@cache-host:6379/0     # any Redis-protocol server
+
+Entries are keyed by function, user, the user's shared data version and the
+arguments. The shared version is a random token stored in the tier itself and
+replaced on every write, by whichever replica makes it, so a stale entry is
+never read again. Tokens rather than counters keep that true when a Redis
+server evicts or loses a version key. Entries expire after SHARED_CACHE_TTL
+seconds; values larger than SHARED_CACHE_MAX_ENTRY_BYTES are not shared. The
+SQLite store evicts the entries closest to expiry once it passes
+SHARED_CACHE_MAX_BYTES; a Redis server enforces its own `maxmemory`.
+
+Values are pickled, so the tier must only be reachable by the app.
+"""
+import hashlib
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import unquote, urlparse
+
+from db import env_int
+
+DEFAULT_SHARED_CACHE_TTL = 60
+# Total budget of the SQLite store (256 MiB)
+DEFAULT_SHARED_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Largest single value shared (4 MiB)
+DEFAULT_SHARED_CACHE_MAX_ENTRY_BYTES = 4 * 1024 * 1024
+KEY_PREFIX = "budget_buddy:"
+
+def new_version():
+    """A fresh, globally unique data version token"""
+    return uuid.uuid4().hex
+
+def entry_key(name, user_id, version, args):
+    """Key of one cached result; the arguments are hashed to keep keys short"""
+    digest = hashlib.sha1(repr(args).encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}{name}:{user_id}:{version}:{digest}"
+
+def version_key(user_id):
+    return f"{KEY_PREFIX}version:{user_id}"
+
+class SQLiteSharedCache:
+    """Shared tier in a SQLite file, for replicas on one host or a shared volume"""
+    name = "sqlite"
+
+    def __init__(self, path, ttl=DEFAULT_SHARED_CACHE_TTL, max_bytes=DEFAULT_SHARED_CACHE_MAX_BYTES,
+                 max_entry_bytes=DEFAULT_SHARED_CACHE_MAX_ENTRY_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries(expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_user ON cache_entries(user_id)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                user_id TEXT PRIMARY KEY,
+                version TEXT NOT NULL
+            )
+        """)
+
+    def _connection(self):
+        # sqlite3 connections belong to the thread that opened them
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def version(self, user_id):
+        conn = self._connection()
+        select = "SELECT version FROM cache_versions WHERE user_id = ?"
+        row = conn.execute(select, (user_id,)).fetchone()
+        if row is None:
+            # Only a user's first lookup writes; another replica may insert first
+            conn.execute("INSERT OR IGNORE INTO cache_versions (user_id, version) VALUES (?, ?)",
+                         (user_id, new_version()))
+            row = conn.execute(select, (user_id,)).fetchone()
+        return row[0]
+
+    def bump_version(self, user_id):
+        conn = self._connection()
+        conn.execute("""
+            INSERT INTO cache_versions (user_id, version) VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET version = excluded.version
+        """, (user_id, new_version()))
+        # Entries under the old version can never be read again
+        conn.execute("DELETE FROM cache_entries WHERE user_id = ?", (user_id,))
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, user_id, value):
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                INSERT OR REPLACE INTO cache_entries (key, user_id, value, size, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (key, user_id, value, len(value), now + self.ttl))
+            conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+            if total > self.max_bytes:
+                # Drop the entries closest to expiry until the store fits its budget
+                conn.execute("""
+                    DELETE FROM cache_entries WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, SUM(size) OVER (ORDER BY expires_at, key) AS freed
+                            FROM cache_entries
+                        ) WHERE freed - size < ?
+                    )
+                """, (total - self.max_bytes,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+class RedisError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+class RedisSharedCache:
+    """Shared tier on a Redis-protocol server, spoken to with a minimal RESP client"""
+    name = "redis"
+
+    def __init__(self, url, ttl=DEFAULT_SHARED_CACHE_TTL,
+                 max_entry_bytes=DEFAULT_SHARED_CACHE_MAX_ENTRY_BYTES, timeout=2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock, self._local.reader = sock, sock.makefile("rb")
+        try:
+            if self.password is not None:
+                self._send(*(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password)))
+            if self.db:
+                self._send("SELECT", self.db)
+        except Exception:
+            sock.close()
+            self._local.sock = None
+            raise
+
+    def _send(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._local.sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply from the cache server: {line!r}")
+
+    def command(self, *args):
+        """Run one command, reconnecting once if the pooled connection went away"""
+        for attempt in range(2):
+            if getattr(self._local, 'sock', None) is None:
+                self._connect()
+            try:
+                return self._send(*args)
+            except (ConnectionError, OSError):
+                self._local.sock.close()
+                self._local.sock = None
+                if attempt:
+                    raise
+
+    def version(self, user_id):
+        key = version_key(user_id)
+        version = self.command("GET", key)
+        if version is None:
+            self.command("SET", key, new_version(), "NX")
+            version = self.command("GET", key)
+        return version.decode()
+
+    def bump_version(self, user_id):
+        # Entries under the old version expire on their own
+        self.command("SET", version_key(user_id), new_version())
+
+    def get(self, key):
+        return self.command("GET", key)
+
+    def set(self, key, user_id, value):
+        self.command("SET", key, value, "PX", int(self.ttl * 1000))
+
+def create_shared_cache(url=None):
+    """Shared tier for SHARED_CACHE_URL, or None when it is not set"""
+    url = url if url is not None else os.environ.get("SHARED_CACHE_URL", "")
+    if not url:
+        return None
+    ttl = env_int("SHARED_CACHE_TTL", DEFAULT_SHARED_CACHE_TTL)
+    max_entry_bytes = env_int("SHARED_CACHE_MAX_ENTRY_BYTES", DEFAULT_SHARED_CACHE_MAX_ENTRY_BYTES)
+
+    scheme = urlparse(url).scheme
+    if scheme == "sqlite":
+        return SQLiteSharedCache(url[len("sqlite:///"):], ttl=ttl,
+                                 max_bytes=env_int("SHARED_CACHE_MAX_BYTES", DEFAULT_SHARED_CACHE_MAX_BYTES),
+                                 max_entry_bytes=max_entry_bytes)
+    if scheme == "redis":
+        return RedisSharedCache(url, ttl=ttl, max_entry_bytes=max_entry_bytes)
+    raise ValueError(f"Unsupported SHARED_CACHE_URL scheme: {scheme}")
+
+def dumps(value):
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+def loads(data):
+    return pickle.loads(data)
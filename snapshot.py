@@ -0,0 +1,178 @@
+"""Everything the dashboard, sidebar and insights need, in one round trip.
+
+`load_dashboard_snapshot` reads the totals, category sums, 30-day daily series,
+month-over-month expenses and the latest transactions with a single statement
+(CTEs over `daily_rollups` plus a short keyset read of `transactions`,
+aggregated with `json_agg`, or `json_group_array` on SQLite) and returns them
+as one `DashboardSnapshot`. Amounts are whole paise.
+"""
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from statements import execute_statement
+
+SNAPSHOT_QUERY = """
+    WITH rollups AS (
+        SELECT day, type, category, total, count
+        FROM daily_rollups
+        WHERE user_id = :user_id
+    ),
+    totals AS (
+        SELECT
+            COALESCE(SUM(CASE WHEN type = 'Income' THEN total END), 0) AS income,
+            COALESCE(SUM(CASE WHEN type = 'Expense' THEN total END), 0) AS expense,
+            COALESCE(SUM(CASE WHEN type = 'Expense'
+                              AND day >= date_trunc('month', CURRENT_DATE)
+                         THEN total END), 0) AS current_month_expense,
+            COALESCE(SUM(CASE WHEN type = 'Expense'
+                              AND day >= date_trunc('month', CURRENT_DATE) - INTERVAL '1 month'
+                              AND day < date_trunc('month', CURRENT_DATE)
+                         THEN total END), 0) AS last_month_expense
+        FROM rollups
+    ),
+    categories AS (
+        SELECT category, type, SUM(total) AS total
+        FROM rollups
+        GROUP BY category, type
+        HAVING SUM(count) > 0
+    ),
+    daily AS (
+        SELECT day, type, SUM(total) AS total
+        FROM rollups
+        WHERE day >= (NOW() - INTERVAL '30 days')::date
+        GROUP BY day, type
+        HAVING SUM(count) > 0
+    ),
+    recent AS (
+        SELECT id, type, category, amount, description, created_at
+        FROM transactions
+        WHERE user_id = :user_id
+        ORDER BY created_at DESC, id DESC
+        LIMIT :recent_limit
+    )
+    SELECT
+        totals.income,
+        totals.expense,
+        totals.current_month_expense,
+        totals.last_month_expense,
+        (SELECT COALESCE(json_agg(json_build_array(category, type, total)
+                                  ORDER BY total DESC), '[]')
+         FROM categories),
+        (SELECT COALESCE(json_agg(json_build_array(day, type, total)
+                                  ORDER BY day DESC), '[]')
+         FROM daily),
+        (SELECT COALESCE(json_agg(json_build_array(id, type, category, amount, description, created_at)
+                                  ORDER BY created_at DESC, id DESC), '[]')
+         FROM recent)
+    FROM totals
+"""
+
+# The same read for the embedded SQLite backend; the aggregates come back as JSON text
+SQLITE_SNAPSHOT_QUERY = """
+    WITH rollups AS (
+        SELECT day, type, category, total, count
+        FROM daily_rollups
+        WHERE user_id = :user_id
+    ),
+    totals AS (
+        SELECT
+            COALESCE(SUM(CASE WHEN type = 'Income' THEN total END), 0) AS income,
+            COALESCE(SUM(CASE WHEN type = 'Expense' THEN total END), 0) AS expense,
+            COALESCE(SUM(CASE WHEN type = 'Expense'
+                              AND day >= date('now', 'localtime', 'start of month')
+                         THEN total END), 0) AS current_month_expense,
+            COALESCE(SUM(CASE WHEN type = 'Expense'
+                              AND day >= date('now', 'localtime', 'start of month', '-1 month')
+                              AND day < date('now', 'localtime', 'start of month')
+                         THEN total END), 0) AS last_month_expense
+        FROM rollups
+    ),
+    categories AS (
+        SELECT category, type, SUM(total) AS total
+        FROM rollups
+        GROUP BY category, type
+        HAVING SUM(count) > 0
+        ORDER BY total DESC
+    ),
+    daily AS (
+        SELECT day, type, SUM(total) AS total
+        FROM rollups
+        WHERE day >= date('now', 'localtime', '-30 days')
+        GROUP BY day, type
+        HAVING SUM(count) > 0
+        ORDER BY day DESC
+    ),
+    recent AS (
+        SELECT id, type, category, amount, description, created_at
+        FROM transactions
+        WHERE user_id = :user_id
+        ORDER BY created_at DESC, id DESC
+        LIMIT :recent_limit
+    )
+    SELECT
+        totals.income,
+        totals.expense,
+        totals.current_month_expense,
+        totals.last_month_expense,
+        (SELECT json_group_array(json_array(category, type, total)) FROM categories),
+        (SELECT json_group_array(json_array(day, type, total)) FROM daily),
+        (SELECT json_group_array(json_array(id, type, category, amount, description, created_at))
+         FROM recent)
+    FROM totals
+"""
+
+@dataclass(frozen=True)
+class DashboardSnapshot:
+    """One consistent read of a user's dashboard data"""
+    income: int = 0
+    expense: int = 0
+    current_month_expense: int = 0
+    last_month_expense: int = 0
+    # (category, type, amount), largest first
+    category_summary: list = field(default_factory=list)
+    # {'date', 'type', 'amount'} per day and type for the last 30 days, newest first
+    daily_summary: list = field(default_factory=list)
+    # Transaction dicts, newest first
+    recent_transactions: list = field(default_factory=list)
+
+    @property
+    def balance(self):
+        return self.income - self.expense
+
+def load_dashboard_snapshot(conn, user_id, recent_limit=5):
+    """Load a DashboardSnapshot for one user with a single statement"""
+    query = SQLITE_SNAPSHOT_QUERY if conn.dialect.name == "sqlite" else SNAPSHOT_QUERY
+    row = execute_statement(conn, query, {
+        'user_id': user_id,
+        'recent_limit': recent_limit
+    }).fetchone()
+
+    income, expense, current_month_expense, last_month_expense, categories, daily, recent = row
+    if isinstance(categories, str):
+        categories, daily, recent = json.loads(categories), json.loads(daily), json.loads(recent)
+
+    return DashboardSnapshot(
+        income=int(income),
+        expense=int(expense),
+        current_month_expense=int(current_month_expense),
+        last_month_expense=int(last_month_expense),
+        category_summary=[
+            (category, type_, int(total)) for category, type_, total in categories
+        ],
+        daily_summary=[
+            {'date': date.fromisoformat(day), 'type': type_, 'amount': int(total)}
+            for day, type_, total in daily
+        ],
+        recent_transactions=[
+            {
+                'id': id_,
+                'type': type_,
+                'category': category,
+                'amount': int(amount),
+                'description': description,
+                'created_at': datetime.fromisoformat(created_at)
+            }
+            for id_, type_, category, amount, description, created_at in recent
+        ]
+    )
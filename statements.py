@@ -0,0 +1,85 @@
+"""Server-side prepared statements for the fixed hot queries.
+
+`execute_statement(conn, sql, params)` runs `sql` (SQLAlchemy `text()` syntax
+with `:name` parameters) as `EXECUTE <name>(...)`, issuing `PREPARE` the first
+time each pooled DBAPI connection sees the statement. The set of prepared
+names lives in the connection's `info` dict, which SQLAlchemy discards with
+the DBAPI connection, so a reconnect simply prepares again. A statement whose
+result type a migration changed fails with "cached plan must not change
+result type"; it is deallocated and prepared again on its next use.
+
+Session-level prepared statements do not survive PgBouncer in transaction
+pooling mode (the next transaction may land on another server connection).
+Set PREPARED_STATEMENTS=0 there; statements then run as plain `text()`.
+The same switch is used to benchmark prepared against unprepared execution.
+"""
+import hashlib
+import re
+
+from psycopg2 import errors as pg_errors
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from db import env_flag
+
+# :name parameters as SQLAlchemy text() reads them, leaving ::casts alone
+PARAMETER_PATTERN = re.compile(r"(?<![:\w\\]):(\w+)(?!:)")
+
+def prepared_statements_enabled():
+    """PREPARED_STATEMENTS switch, on unless set to 0/false/no/off"""
+    return env_flag("PREPARED_STATEMENTS", default=True)
+
+class PreparedStatement:
+    """One SQL text with its PREPARE and EXECUTE forms"""
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.name = "bb_" + hashlib.md5(" ".join(sql.split()).encode()).hexdigest()[:16]
+        # Positional order of the named parameters, first occurrence wins
+        self.params = list(dict.fromkeys(PARAMETER_PATTERN.findall(sql)))
+        positions = {name: i + 1 for i, name in enumerate(self.params)}
+        body = PARAMETER_PATTERN.sub(lambda m: f"${positions[m.group(1)]}", sql)
+        self.prepare_sql = f"PREPARE {self.name} AS {body}"
+        arguments = ", ".join(f":{name}" for name in self.params)
+        self.execute_sql = f"EXECUTE {self.name}({arguments})" if self.params else f"EXECUTE {self.name}"
+
+_statements = {}
+
+def get_statement(sql):
+    """PreparedStatement for `sql`, built once per distinct text"""
+    statement = _statements.get(sql)
+    if statement is None:
+        statement = _statements[sql] = PreparedStatement(sql)
+    return statement
+
+def execute_statement(conn, sql, params=None):
+    """Execute `sql` as a server-side prepared statement on `conn`"""
+    # The embedded SQLite driver caches its prepared statements itself
+    if not prepared_statements_enabled() or conn.dialect.name != "postgresql":
+        return conn.execute(text(sql), params or {})
+
+    statement = get_statement(sql)
+    prepared = conn.info.setdefault('prepared_statements', set())
+    # Names still prepared on the server whose plans no longer fit the schema
+    stale = conn.info.setdefault('stale_statements', set())
+    if statement.name not in prepared:
+        if statement.name in stale:
+            # Forgotten first, so a failing DEALLOCATE is not retried forever
+            stale.discard(statement.name)
+            conn.execute(text(f"DEALLOCATE {statement.name}"))
+        conn.execute(text(statement.prepare_sql))
+        prepared.add(statement.name)
+
+    try:
+        return conn.execute(text(statement.execute_sql), params or {})
+    except DBAPIError as e:
+        # The server lost the statement (DISCARD ALL, a pooler switched
+        # connections); forget it so the next call prepares again
+        if isinstance(e.orig, pg_errors.InvalidSqlStatementName):
+            prepared.discard(statement.name)
+        # A schema change altered the statement's result type; the failed
+        # transaction cannot DEALLOCATE, so the next call does
+        elif isinstance(e.orig, pg_errors.FeatureNotSupported):
+            prepared.discard(statement.name)
+            stale.add(statement.name)
+        raise
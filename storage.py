@@ -0,0 +1,113 @@
+"""Storage backends: PostgreSQL and an embedded single-file SQLite database.
+
+Most queries in the app are portable SQL. The places where the two engines
+differ (date arithmetic, table introspection, bulk loading and the write
+paths that keep `daily_rollups` current) go through the backend returned by
+`get_backend(conn)`.
+
+On PostgreSQL the writes update the rollups in the same statement with
+data-modifying CTEs. SQLite has no data-modifying CTEs, so the embedded
+schema keeps the rollups current with triggers and the writes are plain
+INSERT and DELETE statements.
+"""
+import io
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from db import SQLITE_TIMESTAMP_FORMAT
+from rollups import rollup_add_cte, rollup_subtract_cte
+from statements import execute_statement
+
+INSERT_TRANSACTION = f"""
+    WITH inserted AS (
+        INSERT INTO transactions (user_id, type, category, amount, description)
+        VALUES (:user_id, :type, :category, :amount, :description)
+        RETURNING user_id, created_at, type, category, amount
+    ),
+    {rollup_add_cte('inserted')}
+    SELECT COUNT(*) FROM inserted
+"""
+
+DELETE_TRANSACTIONS = f"""
+    WITH deleted AS (
+        DELETE FROM transactions
+        WHERE user_id = :user_id AND id = ANY(CAST(:ids AS INTEGER[]))
+        RETURNING user_id, created_at, type, category, amount
+    ),
+    {rollup_subtract_cte('deleted')}
+    SELECT COUNT(*) FROM deleted
+"""
+
+class PostgresBackend:
+    """The networked PostgreSQL database behind DATABASE_URL"""
+    name = "postgresql"
+    embedded = False
+
+    def days_ago(self, days):
+        return f"(NOW() - INTERVAL '{int(days)} days')::date"
+
+    def table_exists(self, conn, table):
+        return conn.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {'table': table}).scalar()
+
+    def bulk_insert(self, cursor, table, columns, frame):
+        """Stream a DataFrame into `table` with COPY"""
+        buffer = io.StringIO()
+        frame[columns].to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S')
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+    def insert_transaction(self, conn, params):
+        """Insert one transaction and update its rollup"""
+        execute_statement(conn, INSERT_TRANSACTION, params)
+
+    def delete_transactions(self, conn, user_id, ids):
+        """Delete some of a user's transactions and update their rollups; returns the number deleted"""
+        return execute_statement(conn, DELETE_TRANSACTIONS, {'user_id': user_id, 'ids': list(ids)}).scalar()
+
+class SQLiteBackend:
+    """Embedded single-file SQLite database in WAL mode"""
+    name = "sqlite"
+    embedded = True
+
+    def days_ago(self, days):
+        return f"date('now', 'localtime', '-{int(days)} days')"
+
+    def table_exists(self, conn, table):
+        return conn.execute(text(
+            "SELECT COUNT(*) > 0 FROM sqlite_master WHERE type = 'table' AND name = :table"
+        ), {'table': table}).scalar()
+
+    def bulk_insert(self, cursor, table, columns, frame):
+        """Insert a DataFrame into `table` with executemany"""
+        frame = frame[columns].copy()
+        for column in columns:
+            if pd.api.types.is_datetime64_any_dtype(frame[column]):
+                frame[column] = frame[column].dt.strftime(SQLITE_TIMESTAMP_FORMAT)
+        placeholders = ", ".join("?" for _ in columns)
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            frame.astype(object).itertuples(index=False, name=None)
+        )
+
+    def insert_transaction(self, conn, params):
+        """Insert one transaction; a trigger updates its rollup"""
+        conn.execute(text("""
+            INSERT INTO transactions (user_id, type, category, amount, description)
+            VALUES (:user_id, :type, :category, :amount, :description)
+        """), params)
+
+    def delete_transactions(self, conn, user_id, ids):
+        """Delete some of a user's transactions; returns the number deleted"""
+        result = conn.execute(text("""
+            DELETE FROM transactions
+            WHERE user_id = :user_id AND id IN :ids
+            RETURNING id
+        """).bindparams(bindparam('ids', expanding=True)), {'user_id': user_id, 'ids': list(ids)})
+        return len(result.fetchall())
+
+BACKENDS = {backend.name: backend for backend in (PostgresBackend(), SQLiteBackend())}
+
+def get_backend(conn):
+    """Backend for a Connection or Engine"""
+    return BACKENDS[conn.dialect.name]
@@ -0,0 +1,156 @@
+"""Optional write-behind buffer with group commit for new transactions.
+
+Form submits are queued in-process and a background worker inserts them in
+batches: it flushes once `batch_size` rows are waiting or the oldest row has
+waited `max_latency` seconds, whichever comes first. Every batch is a single
+multi-row INSERT (plus the rollup upsert) and one commit.
+
+Durability is configurable:
+- "sync": callers wait on the returned future until their batch has committed.
+- "async": callers return as soon as the row is queued and the batch commits
+  with `synchronous_commit = off`; rows still queued are lost if the process
+  dies, so only use it where that is acceptable.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import text
+
+from db import env_flag, env_int
+from rollups import rollup_add_cte
+
+DURABILITY_MODES = ("sync", "async")
+
+INSERT_BATCH = f"""
+    WITH inserted AS (
+        INSERT INTO transactions (user_id, type, category, amount, description)
+        SELECT * FROM unnest(
+            CAST(:user_ids AS VARCHAR[]),
+            CAST(:types AS VARCHAR[]),
+            CAST(:categories AS VARCHAR[]),
+            CAST(:amounts AS BIGINT[]),
+            CAST(:descriptions AS TEXT[])
+        )
+        RETURNING user_id, created_at, type, category, amount
+    ),
+    {rollup_add_cte('inserted')}
+    SELECT COUNT(*) FROM inserted
+"""
+
+def write_behind_enabled():
+    """Whether WRITE_BEHIND is switched on in the environment"""
+    return env_flag("WRITE_BEHIND")
+
+def write_behind_settings():
+    """Batch size, latency window (seconds) and durability from the environment"""
+    durability = os.environ.get("WRITE_BEHIND_DURABILITY", "sync").lower()
+    if durability not in DURABILITY_MODES:
+        durability = "sync"
+    return {
+        'batch_size': max(env_int("WRITE_BEHIND_BATCH_SIZE", 100), 1),
+        'max_latency': max(env_int("WRITE_BEHIND_MAX_LATENCY_MS", 50), 0) / 1000,
+        'durability': durability
+    }
+
+class WriteBehindBuffer:
+    """Queue of pending transaction inserts flushed by one background thread"""
+
+    def __init__(self, engine, batch_size=100, max_latency=0.05, durability="sync", on_flush=None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.durability = durability
+        # Called with the set of user_ids whose rows were just committed
+        self.on_flush = on_flush
+        self.flushed_batches = 0
+        self.flushed_rows = 0
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def submit(self, user_id, transaction_type, category, amount, description=""):
+        """Queue one insert of `amount` paise; the returned future resolves to True once it is committed"""
+        if self._stopped.is_set():
+            raise RuntimeError("Write-behind buffer is closed")
+        future = Future()
+        self._queue.put(((user_id, transaction_type, category, int(amount), description), future))
+        return future
+
+    def close(self, timeout=10):
+        """Flush everything still queued and stop the worker"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._queue.put(None)
+        self._worker.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_latency
+
+            # Gather more rows until the batch is full or the window closes
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._flush(batch)
+                    return
+                batch.append(item)
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            self._insert([row for row, _ in batch])
+            inserted, commits = batch, 1
+        except Exception:
+            # Retry one by one so a single bad row only fails its own submit
+            inserted = []
+            for row, future in batch:
+                try:
+                    self._insert([row])
+                    inserted.append((row, future))
+                except Exception as e:
+                    print(f"❌ Write-behind insert failed: {str(e)}")
+                    future.set_exception(e)
+            commits = len(inserted)
+
+        self.flushed_batches += commits
+        self.flushed_rows += len(inserted)
+        if inserted and self.on_flush is not None:
+            # The rows are committed; a failing callback must not insert them again
+            try:
+                self.on_flush({row[0] for row, _ in inserted})
+            except Exception as e:
+                print(f"⚠️ Write-behind flush callback failed: {str(e)}")
+        for _, future in inserted:
+            future.set_result(True)
+
+    def _insert(self, rows):
+        user_ids, types, categories, amounts, descriptions = (list(column) for column in zip(*rows))
+        with self.engine.connect() as conn:
+            if self.durability == "async":
+                conn.execute(text("SET LOCAL synchronous_commit TO OFF"))
+            conn.execute(text(INSERT_BATCH), {
+                'user_ids': user_ids,
+                'types': types,
+                'categories': categories,
+                'amounts': amounts,
+                'descriptions': descriptions
+            })
+            conn.commit()